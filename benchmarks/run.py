@@ -0,0 +1,231 @@
+# coding: utf8
+"""
+Benchmark the stages of the CLICS pipeline on synthetic corpora of several scales.
+
+    python benchmarks/run.py [--scales small,medium] [--stages load,colexification] \
+        [--output benchmark.json]
+
+Each stage runs in a fresh process - the computational stages via the `clics` command line
+interface - so that wall time, CPU time and peak RSS can be measured per stage. The results
+are written as JSON to the output file, to be compared between commits.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import attr
+
+sys.path.insert(0, str(Path(__file__).parent))
+from synthetic import Corpus, load  # noqa: E402
+
+SCALES = OrderedDict([
+    ('tiny', Corpus(varieties=10, concepts=50, families=3, datasets=1)),
+    ('small', Corpus(varieties=50, concepts=300, families=10, datasets=2)),
+    ('medium', Corpus(varieties=200, concepts=1000, families=30, datasets=4)),
+    ('large', Corpus(varieties=1000, concepts=1500, families=100, datasets=10)),
+])
+STAGES = ['load', 'colexification', 'communities', 'subgraph', 'create-lang-graph']
+# Run the `clics` command line interface from the interpreter running the benchmark:
+CLI = 'import sys; from pyclics.__main__ import main; sys.argv[0] = "clics"; main()'
+
+
+def parse_scale(spec):
+    """
+    :param spec: Name of a scale in `SCALES` or `VARIETIESxCONCEPTSxFAMILIES[xHOMOPHONY]`,
+        e.g. `100x500x20` or - with a rate of homophony of 10% - `100x500x20x0.1`.
+    :return: pair (name, `Corpus`).
+    """
+    if spec in SCALES:
+        return spec, SCALES[spec]
+    fields = spec.split('x')
+    try:
+        if len(fields) not in [3, 4]:
+            raise ValueError(spec)
+        kw = dict(zip(['varieties', 'concepts', 'families'], [int(n) for n in fields[:3]]))
+        if len(fields) == 4:
+            kw['homophony'] = float(fields[3])
+            if not 0 <= kw['homophony'] <= 1:
+                raise ValueError(spec)
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid scale: {0}'.format(spec))
+    return spec, Corpus(**kw)
+
+
+def _files(d):
+    return {
+        str(p.relative_to(d)): (p.stat().st_size, p.stat().st_mtime_ns)
+        for p in d.glob('**/*') if p.is_file()}
+
+
+def _measure(cmd, cwd, log):
+    """
+    Run a command in a child process.
+
+    :return: `dict` with exit code, wall time and CPU time in seconds, and peak RSS in bytes.
+    """
+    start = time.perf_counter()
+    with log.open('a', encoding='utf8') as fp:
+        fp.write('$ {0}\n'.format(' '.join(cmd)))
+        fp.flush()
+        proc = subprocess.Popen(cmd, cwd=str(cwd), stdout=fp, stderr=subprocess.STDOUT)
+        # os.wait4 returns the resource usage of this particular child:
+        _, status, rusage = os.wait4(proc.pid, 0)
+    wall_time = time.perf_counter() - start
+    proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    return OrderedDict([
+        ('returncode', proc.returncode),
+        ('wall_time', round(wall_time, 3)),
+        ('cpu_time', round(rusage.ru_utime + rusage.ru_stime, 3)),
+        # ru_maxrss is given in bytes on macOS, in kilobytes elsewhere:
+        ('peak_rss', rusage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)),
+    ])
+
+
+def run_stage(stage, repos, corpus_dirs, workers, args, log):
+    """
+    Run a stage of the pipeline, measuring resource usage and the size of the files written.
+    """
+    before = _files(repos)
+    if stage == 'load':
+        # The command is run in the repository directory, thus the script path must be absolute:
+        cmd = [sys.executable, str(Path(__file__).resolve()), '--load', str(repos)] + \
+            [str(d) for d in corpus_dirs]
+    else:
+        cmd = [
+            sys.executable, '-c', CLI,
+            '--output', str(repos),
+            '--threshold', str(args.threshold),
+            '--workers', str(workers),
+            stage]
+    res = _measure(cmd, repos, log)
+
+    after = _files(repos)
+    outputs = OrderedDict()
+    for name, (size, mtime) in sorted(after.items()):
+        if before.get(name) != (size, mtime):
+            key = Path(name).parts[0]
+            outputs.setdefault(key, OrderedDict([('files', 0), ('bytes', 0)]))
+            outputs[key]['files'] += 1
+            outputs[key]['bytes'] += size
+    res['output_files'] = sum(o['files'] for o in outputs.values())
+    res['output_bytes'] = sum(o['bytes'] for o in outputs.values())
+    res['outputs'] = outputs
+    return res
+
+
+def _describe():
+    try:
+        return subprocess.check_output(
+            ['git', 'describe', '--always', '--dirty'],
+            cwd=str(Path(__file__).parent),
+            stderr=subprocess.DEVNULL).decode('utf8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark(args):
+    from clldutils.markup import Table
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix='clics-benchmark-'))
+    results = OrderedDict([
+        ('commit', _describe()),
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('date', datetime.datetime.utcnow().replace(microsecond=0).isoformat()),
+        ('threshold', args.threshold),
+        ('workers', args.workers),
+        ('runs', []),
+    ])
+    table = Table(
+        'Scale', 'Workers', 'Stage',
+        'Wall time [s]', 'CPU time [s]', 'Peak RSS [MB]', 'Output [MB]')
+    try:
+        for name, corpus in args.scales:
+            d = workdir / name
+            if d.exists():
+                shutil.rmtree(str(d))
+            corpus_dirs = corpus.write(d / 'corpus')
+            for workers in args.workers:
+                # The pipeline is run on a fresh repository for each number of workers, so that
+                # no stage can reuse results of a previous run:
+                repos = d / 'repos-{0}'.format(workers)
+                repos.mkdir(parents=True)
+                for stage in args.stages:
+                    res = OrderedDict([('scale', name), ('corpus', attr.asdict(corpus))])
+                    res['workers'] = workers
+                    res['stage'] = stage
+                    res.update(run_stage(stage, repos, corpus_dirs, workers, args, d / 'log.txt'))
+                    results['runs'].append(res)
+                    table.append([
+                        name,
+                        workers,
+                        stage,
+                        res['wall_time'],
+                        res['cpu_time'],
+                        round(res['peak_rss'] / 1024 ** 2, 1),
+                        round(res['output_bytes'] / 1024 ** 2, 1)])
+                    if res['returncode']:
+                        print('stage {0} failed for scale {1} - see {2}'.format(
+                            stage, name, d / 'log.txt'))
+                        break
+    finally:
+        if not args.workdir:
+            shutil.rmtree(str(workdir))
+
+    with Path(args.output).open('w', encoding='utf8') as fp:
+        json.dump(results, fp, indent=2)
+    print(table.render(tablefmt='simple'))
+    print('\nresults written to {0}'.format(args.output))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument(
+        '--scales',
+        type=lambda s: [parse_scale(spec) for spec in s.split(',')],
+        default=[parse_scale(name) for name in ['small', 'medium']],
+        help='comma separated scales - {0} or VARIETIESxCONCEPTSxFAMILIES[xHOMOPHONY] '
+             '(default: {1})'.format(', '.join(SCALES), 'small,medium'))
+    parser.add_argument(
+        '--stages',
+        type=lambda s: s.split(','),
+        default=STAGES,
+        help='comma separated stages to run, in order (default: {0})'.format(','.join(STAGES)))
+    parser.add_argument('-t', '--threshold', type=int, default=1)
+    parser.add_argument(
+        '--workers',
+        type=lambda s: [int(n) for n in s.split(',')],
+        default=[1],
+        help='comma separated numbers of worker processes to run the stages with, e.g. "1,4" '
+             'to compare serial and parallel runs (default: 1)')
+    parser.add_argument('-o', '--output', default='benchmark.json', help='results file')
+    parser.add_argument(
+        '--workdir', default=None, help='directory to keep the corpora and outputs in')
+    parser.add_argument('--load', nargs='+', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.load:
+        # Run in a child process, to load the synthetic datasets into the database:
+        from pyclics.api import Clics
+
+        load(Clics(args.load[0]).db, [Path(d) for d in args.load[1:]])
+        return
+
+    for stage in args.stages:
+        if stage not in STAGES:
+            parser.error('unknown stage: {0}'.format(stage))
+    benchmark(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+# coding: utf8
+"""
+Generate synthetic lexibank datasets, i.e. CLDF wordlists with the metadata CLICS needs.
+
+The languages of a synthetic corpus are grouped into families, the concepts into semantic
+fields. Homophony - and thus colexification - is modelled as
+- a set of colexified pairs of concepts per family, mostly within semantic fields, which each
+  language of the family retains with some probability,
+- plus random homophones in individual languages.
+
+Glottocodes, families and Concepticon glosses are written to the CLDF data, and `load`
+adds coordinates, so the datasets can be loaded into a CLICS database without Glottolog and
+Concepticon.
+"""
+import json
+import random
+from pathlib import Path
+
+import attr
+
+__all__ = ['Corpus', 'datasets', 'load']
+
+ALPHABET = ['ptkbdgmnslrwjh', 'aeiou']
+FIELD_SIZE = 10
+CATEGORIES = ['Person/Thing', 'Action/Process', 'Property', 'Other']
+
+
+def _word(rng):
+    return ''.join(
+        rng.choice(ALPHABET[0]) + rng.choice(ALPHABET[1]) for _ in range(rng.randint(1, 3)))
+
+
+@attr.s
+class Corpus(object):
+    """
+    Specification of a synthetic corpus of lexibank datasets.
+
+    :param varieties: Number of languages, spread evenly over `datasets`.
+    :param concepts: Number of concepts.
+    :param families: Number of language families.
+    :param homophony: Probability for a word to be a homophone of the word for another concept.
+    :param datasets: Number of datasets.
+    :param coverage: Proportion of the concepts covered by each dataset.
+    :param retention: Probability of a language to retain a colexification of its family.
+    :param seed: Seed of the random number generator, making the corpus reproducible.
+    """
+    varieties = attr.ib(default=20)
+    concepts = attr.ib(default=200)
+    families = attr.ib(default=5)
+    homophony = attr.ib(default=0.05)
+    datasets = attr.ib(default=1)
+    coverage = attr.ib(default=0.9)
+    retention = attr.ib(default=0.7)
+    seed = attr.ib(default=1)
+
+    def write(self, directory):
+        """
+        Write the datasets of the corpus to subdirectories of `directory`.
+
+        :return: `list` of `pathlib.Path` of the dataset directories.
+        """
+        rng = random.Random(self.seed)
+        concepts = [
+            {
+                'ID': str(i),
+                'Name': 'concept {0}'.format(i),
+                'Concepticon_ID': str(i),
+                'Concepticon_Gloss': 'CONCEPT_{0}'.format(i),
+                'Ontological_Category': CATEGORIES[i % len(CATEGORIES)],
+                'Semantic_Field': 'Field {0}'.format(i // FIELD_SIZE),
+            } for i in range(1, self.concepts + 1)]
+
+        def partner(i):
+            # Colexified concepts mostly belong to the same semantic field:
+            if rng.random() < 0.8:
+                field = i // FIELD_SIZE * FIELD_SIZE
+                j = rng.randrange(field, min(field + FIELD_SIZE, self.concepts))
+            else:
+                j = rng.randrange(self.concepts)
+            return j if j != i else None
+
+        family_colexifications = [
+            [(i, partner(i)) for i in range(self.concepts) if rng.random() < self.homophony]
+            for _ in range(self.families)]
+
+        res = []
+        for n in range(self.datasets):
+            dsid = 'synthetic{0}'.format(n + 1)
+            ds_dir = Path(directory) / dsid
+            ds_concepts = sorted(
+                rng.sample(range(self.concepts), max(int(self.concepts * self.coverage), 2)))
+            languages, forms = [], []
+            for lid in range(n, self.varieties, self.datasets):
+                family = lid % self.families
+                languages.append({
+                    'ID': 'lang{0}'.format(lid + 1),
+                    'Name': 'Language {0}'.format(lid + 1),
+                    'Glottocode': 'synt{0:04d}'.format(lid + 1),
+                    'Family': 'Family {0}'.format(family + 1),
+                    'Macroarea': 'Eurasia',
+                })
+                words = {i: _word(rng) for i in ds_concepts}
+                for i, j in family_colexifications[family]:
+                    if j is not None and j in words and rng.random() < self.retention:
+                        words[i] = words[j]
+                for i in ds_concepts:
+                    if rng.random() < self.homophony / 4:
+                        words[i] = words[rng.choice(ds_concepts)]
+                for i in ds_concepts:
+                    forms.append({
+                        'ID': '{0}-{1}'.format(languages[-1]['ID'], i + 1),
+                        'Language_ID': languages[-1]['ID'],
+                        'Parameter_ID': str(i + 1),
+                        'Value': words[i],
+                        'Form': words[i],
+                        'Segments': list(words[i]),
+                    })
+            _write_dataset(ds_dir, languages, [concepts[i] for i in ds_concepts], forms)
+            res.append(ds_dir)
+        return res
+
+
+def _dataset_class(directory):
+    from pylexibank.dataset import Dataset, Concept
+
+    @attr.s
+    class SyntheticConcept(Concept):
+        Ontological_Category = attr.ib(default=None)
+        Semantic_Field = attr.ib(default=None)
+
+    return type(str('SyntheticDataset'), (Dataset,), {
+        'dir': str(directory),
+        'concept_class': SyntheticConcept,
+    })
+
+
+def _write_dataset(directory, languages, concepts, forms):
+    directory.mkdir(parents=True, exist_ok=True)
+    with directory.joinpath('metadata.json').open('w', encoding='utf8') as fp:
+        json.dump({'title': 'Synthetic dataset {0}'.format(directory.name)}, fp)
+
+    # We use the CLDF metadata of lexibank - extended with the additional columns of our
+    # concept class - but write the data directly, because lexibank would record the versions
+    # of Concepticon and Glottolog in the metadata:
+    wordlist = _dataset_class(directory)().cldf.wl
+    wordlist.write(
+        FormTable=forms, LanguageTable=languages, ParameterTable=concepts, CognateTable=[])
+
+
+def datasets(directories):
+    """
+    :param directories: Directories of synthetic datasets, as written by `Corpus.write`.
+    :return: `list` of `pylexibank.dataset.Dataset` instances.
+    """
+    return [_dataset_class(d)() for d in directories]
+
+
+def load(db, directories):
+    """
+    Load synthetic datasets into a CLICS database.
+
+    :param db: `pyclics.db.Database` instance.
+    :return: `list` of IDs of the datasets loaded.
+    """
+    db.create(exists_ok=True)
+    res = list(db.load_datasets(datasets(directories)))
+    # Like `clics load` does with data from Glottolog, we add coordinates for the languages:
+    coordinates = []
+    for (glottocode,) in db.fetchall('SELECT distinct glottocode FROM languagetable'):
+        rng = random.Random(glottocode)
+        coordinates.append((rng.uniform(-60, 70), rng.uniform(-180, 180), glottocode))
+    with db.connection() as conn:
+        conn.executemany(
+            'UPDATE languagetable SET latitude = ?, longitude = ? WHERE glottocode = ?',
+            coordinates)
+        conn.commit()
+    return res
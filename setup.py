@@ -47,6 +47,12 @@ setup(
             'pytest-mock',
             'pytest-cov',
             'coverage>=4.2',
+            'numpy',
+            'scipy',
+        ],
+        'sparse': [
+            'numpy',
+            'scipy',
         ],
     },
     entry_points={
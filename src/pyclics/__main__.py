@@ -4,7 +4,6 @@ import argparse
 import random
 from pathlib import Path
 
-import numpy
 from clldutils.clilib import ArgumentParserWithLogging
 
 import pyclics
@@ -14,21 +13,63 @@ import pyclics.commands
 assert pyclics.commands
 
 random.seed(123456)
-numpy.random.seed(123456)
 
 
 def main():  # pragma: no cover
     parser = ArgumentParserWithLogging(pyclics.__name__)
     parser.add_argument('-t', '--threshold', type=int, default=None)
     parser.add_argument('-f', '--edgefilter', default='families')
+    parser.add_argument(
+        '--thresholds',
+        default=None,
+        help='thresholds for which to compute networks, e.g. "1-3,5"')
+    parser.add_argument(
+        '--edgefilters',
+        default=None,
+        help='edge filters for which to compute networks, e.g. "families,words"')
     parser.add_argument('-n', '--normalize', action='store_true')
     parser.add_argument('-g', '--graphname', default=None)
     parser.add_argument('-w', '--weight', default='FamilyWeight')
     parser.add_argument('--unloaded', action='store_true', default=False)
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='number of processes to use for loading datasets or computing colexifications')
+    parser.add_argument(
+        '--sparse',
+        action='store_true',
+        default=False,
+        help='only compute colexification weights, using sparse matrices (requires scipy)')
+    parser.add_argument(
+        '--no-export',
+        dest='export',
+        action='store_false',
+        default=True,
+        help='only save the graphs computed by the communities and subgraph commands, but do '
+             'not export the data for the CLICS app (e.g. when serving the app)')
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        default=False,
+        help='write the resource usage of the stages of the command as JSON - and cProfile '
+             'statistics for each stage - to the directory profile/COMMAND')
     parser.add_argument('-v', '--verbose', default=False, action='store_true')
     parser.add_argument('-o', '--output', default=None, help='output directory')
     parser.add_argument('--api', help=argparse.SUPPRESS, default=Clics(Path('.')))
     args = parser.parse_args()
     if args.output:
         args.api.repos = Path(args.output)
-    sys.exit(parser.main(parsed_args=args))
+    # The API logs the files written and the resource usage of the stages of the command:
+    args.api._log = args.log
+    if args.profile:
+        profile_dir = args.api.existing_dir('profile', args.command, clean=True)
+        args.api.instrumentation.profile_dir = profile_dir
+    try:
+        with args.api.stage(args.command):
+            res = parser.main(parsed_args=args)
+    finally:
+        args.api.readonly_db.close()
+    if args.profile:
+        args.api.file_written(args.api.instrumentation.write(profile_dir / 'stages.json'))
+    sys.exit(res)
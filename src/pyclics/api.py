@@ -1,5 +1,10 @@
 # coding: utf8
 import json
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from contextlib import contextmanager
+from itertools import chain, islice
 
 from clldutils.apilib import API
 from clldutils.path import write_text
@@ -7,11 +12,52 @@ from clldutils.dsv import UnicodeWriter
 from clldutils.misc import lazyproperty
 from clldutils import jsonlib
 
-from pyclics.db import Database
-from pyclics.models import Network
+from pyclics.models import Network, GRAPH_FORMATS
+from pyclics.instrumentation import Instrumentation
 
 __all__ = ['Clics']
 
+JSON_BUFFER_SIZE = 256 * 1024
+# The evidence for the edges of a colexification network is stored in files of this many edges:
+EVIDENCE_CHUNK_SIZE = 1000
+
+
+def _write_json(item):
+    """
+    Serialize an object as JSON and write it to a file - unless the file exists with the same
+    content already.
+
+    :return: pair (path, `bool` flag signaling whether the file was written).
+    """
+    path, obj = item
+    content = json.dumps(obj, sort_keys=True).encode('utf8')
+    if path.exists() and path.stat().st_size == len(content):
+        with path.open('rb') as fp:
+            if fp.read() == content:
+                return path, False
+    with path.open('wb', buffering=JSON_BUFFER_SIZE) as fp:
+        fp.write(content)
+    return path, True
+
+
+def _save(network, graph, formats):
+    # The binary format is written last, so that it is at least as recent as the GML file.
+    return [network.save(graph, fmt=fmt) for fmt in sorted(formats, key=GRAPH_FORMATS.index)]
+
+
+def _instrumented_save(network, graph, formats):
+    """
+    Write a graph - in a worker process - recording the resource usage of writing each format.
+
+    :return: pair (`list` of paths of the files written, `list` of `Stage` instances).
+    """
+    instrumentation, res = Instrumentation(), []
+    for fmt in sorted(formats, key=GRAPH_FORMATS.index):
+        with instrumentation.stage(
+                '{0} write'.format(fmt), nodes=len(graph), edges=graph.number_of_edges()):
+            res.extend(_save(network, graph, [fmt]))
+    return res, instrumentation.stages
+
 
 class Clics(API):
     _log = None
@@ -30,10 +76,39 @@ class Clics(API):
                     p.unlink()
         return d
 
+    @lazyproperty
+    def instrumentation(self):
+        return Instrumentation()
+
+    def _log_stage(self, stage):
+        if self._log:
+            self._log.info('stage {0}'.format(json.dumps(stage.as_dict())))
+
+    @contextmanager
+    def stage(self, name, **counts):
+        """
+        Record the resource usage of a stage of a computation (see
+        `pyclics.instrumentation.Instrumentation.stage`), logging it as JSON.
+        """
+        with self.instrumentation.stage(name, **counts) as stage:
+            yield stage
+        self._log_stage(stage)
+
     @lazyproperty
     def db(self):
+        from pyclics.db import Database
+
         return Database(self.path('clics.sqlite'))
 
+    @lazyproperty
+    def readonly_db(self):
+        """
+        The database opened in read-only mode, for use in analysis commands.
+        """
+        from pyclics.db import Database
+
+        return Database(self.path('clics.sqlite'), readonly=True)
+
     def file_written(self, p):
         if self._log:
             self._log.info('{0} written'.format(p))
@@ -49,21 +124,162 @@ class Clics(API):
         jsonlib.dump(obj, p, indent=2)
         self.file_written(p)
 
+    def json_export(self, items, *path, workers=1):
+        """
+        Export JSON files to a directory, replacing its content.
+
+        Files with unchanged content are not rewritten, and files not in `items` are removed.
+
+        :param items: iterable of pairs (file name, object to serialize); for repeated file
+            names, the last object is written.
+        :param workers: number of processes to use for serializing and writing the objects.
+        :return: `list` of paths of the files written.
+        """
+        d = self.existing_dir(*path)
+        objs = OrderedDict()
+        for name, obj in items:
+            objs[name] = obj
+        for p in d.iterdir():
+            if p.is_file() and p.name not in objs:
+                p.unlink()
+
+        items = ((d / name, obj) for name, obj in objs.items())
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                res = list(executor.map(_write_json, items, chunksize=64))
+        else:
+            res = [_write_json(item) for item in items]
+        written = [p for p, changed in res if changed]
+        if self._log:
+            self._log.info('{0} of {1} files written to {2}'.format(len(written), len(res), d))
+        return written
+
+    def evidence_export(self, evidence, store, workers=1):
+        """
+        Write the evidence for the edges of a colexification network to
+        `app/source/evidence/<store>`.
+
+        The evidence for the edge with ID `i` is stored as item `i % EVIDENCE_CHUNK_SIZE` of the
+        JSON array in file `<i // EVIDENCE_CHUNK_SIZE>.json`. Since edge IDs are only valid for
+        the aggregate they were assigned in, each aggregate is exported to its own store, which
+        is referenced by the `evidence` attribute of the networks computed from it.
+
+        :param evidence: iterable of evidence lists, ordered by edge ID.
+        :param store: Name of the store, e.g. `pyclics.util.Colexifications.digest`.
+        """
+        evidence = iter(evidence)
+        return self.json_export(
+            (
+                ('{0}.json'.format(i), chunk) for i, chunk in
+                enumerate(iter(lambda: list(islice(evidence, EVIDENCE_CHUNK_SIZE)), []))),
+            'app', 'source', 'evidence', store,
+            workers=workers)
+
+    def evidence(self, store, edge_id):
+        """
+        :param store: The `evidence` attribute of a colexification network.
+        :param edge_id: The `evidence` attribute of an edge of the network.
+        :return: `list` of colexifying word pairs (see `pyclics.util.Colexifications.evidence`).
+        """
+        chunk, offset = divmod(edge_id, EVIDENCE_CHUNK_SIZE)
+        return jsonlib.load(
+            self.path('app', 'source', 'evidence', store, '{0}.json'.format(chunk)))[offset]
+
     def write_js_var(self, var_name, var, *path):
         p = self.path(*path)
         write_text(p, 'var ' + var_name + ' = ' + json.dumps(var, indent=2) + ';')
         self.file_written(p)
 
-    def save_graph(self, graph, network, threshold, edgefilter):
+    def _save_graph(self, graph, network, formats):
+        res = []
+        for fmt in sorted(formats, key=GRAPH_FORMATS.index):
+            with self.stage(
+                    '{0} write'.format(fmt),
+                    nodes=len(graph),
+                    edges=graph.number_of_edges()):
+                res.extend(self.file_written(p) for p in _save(network, graph, [fmt]))
+        return res
+
+    def save_graph(self, graph, network, threshold, edgefilter, formats=GRAPH_FORMATS):
+        """
+        Write a concept graph to the `graphs` directory.
+
+        :param formats: The formats in which to write the graph - the binary format `bin` is
+            fast to load, while `gml` serves as an export format for other tools.
+        :return: `list` of paths of the files written.
+        """
         network = Network(network, threshold, edgefilter, self.existing_dir('graphs'))
-        return self.file_written(network.save(graph))
-    
-    def save_lang_graph(self, graph, network, threshold, edgefilter):
+        return self._save_graph(graph, network, formats)
+
+    def save_graphs(self, graphs, network, workers=1, formats=GRAPH_FORMATS):
+        """
+        Write variants of a concept graph - for different thresholds and edge filters - to the
+        `graphs` directory.
+
+        :param graphs: iterable of triples (threshold, edgefilter, graph).
+        :param workers: number of processes to use for writing the files - if there is more than
+            one graph.
+        :return: `list` of paths of the files written.
+        """
+        graphs = iter(graphs)
+        if workers > 1:
+            batch = list(islice(graphs, workers))
+            if len(batch) > 1:
+                return self._save_graphs(chain([batch], iter(
+                    lambda: list(islice(graphs, workers)), [])), network, workers, formats)
+            graphs = iter(batch)
+
+        res = []
+        for threshold, edgefilter, graph in graphs:
+            res.extend(self.save_graph(graph, network, threshold, edgefilter, formats=formats))
+            # Release the variant before the next one is computed:
+            del graph
+        return res
+
+    def _save_graphs(self, batches, network, workers, formats):
+        res = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            # Variants are computed in batches, to not keep all of them in memory at once:
+            for batch in batches:
+                networks = [
+                    Network(network, threshold, edgefilter, self.existing_dir('graphs'))
+                    for threshold, edgefilter, _ in batch]
+                for paths, stages in executor.map(
+                        partial(_instrumented_save, formats=formats),
+                        networks,
+                        [b[2] for b in batch]):
+                    res.extend(self.file_written(p) for p in paths)
+                    # The stages recorded in the worker process are added to our records:
+                    for stage in stages:
+                        self._log_stage(self.instrumentation.add(stage))
+                del batch
+        return res
+
+    def save_lang_graph(self, graph, network, threshold, edgefilter, formats=GRAPH_FORMATS):
         network = Network(network, threshold, edgefilter, self.existing_dir('lang_graphs'))
-        return self.file_written(network.save(graph))
+        return self._save_graph(graph, network, formats)
+
+    def lang_graph_evidence(self, network, threshold):
+        """
+        The store of colexifications shared by the languages linked in a language graph.
+
+        :return: `EvidenceStore` instance.
+        """
+        from pyclics.db import EvidenceStore
+
+        return EvidenceStore(Network(
+            network, threshold, 'colexifications', self.existing_dir('lang_graphs')).path('sqlite'))
+
+    def load_graph(self, network, threshold, edgefilter, fmt=None):
+        """
+        Read a concept graph from the `graphs` directory.
 
-    def load_graph(self, network, threshold, edgefilter):
-        return Network(network, threshold, edgefilter, self.existing_dir('graphs')).graph
+        :param fmt: `bin` or `gml` - by default, the binary file is read if it is up-to-date.
+        """
+        with self.stage('graph load') as stage:
+            graph = Network(network, threshold, edgefilter, self.existing_dir('graphs')).load(fmt)
+            stage.count(nodes=len(graph), edges=graph.number_of_edges())
+        return graph
 
     def load_network(self, nname, threshold, edgefilter):
         return Network(nname, threshold, edgefilter, self.existing_dir('graphs'))
@@ -5,13 +5,39 @@ var opacity = 100;
 var coloring = "Family";
 
 
-// load data about words for each edge
-var linkByWords = {};
-d3.json('source/words.json', function(words){
-    for (var key in words){
-        linkByWords[key] = words[key];
+// load the evidence for an edge, i.e. the list of colexifying word pairs, each given as
+// [form A ID, form B ID, normalized form, language ID, family, form A, form B]; the evidence
+// for edge i is stored as item i % EVIDENCE_CHUNK_SIZE in file i / EVIDENCE_CHUNK_SIZE of the
+// store referenced by the network. Networks computed without evidence (e.g. with --sparse)
+// don't reference a store, and their edges have no evidence key.
+var EVIDENCE_CHUNK_SIZE = 1000;
+var evidenceChunks = {};
+function withEvidence(store, key, callback){
+  if (store == null || key == null){
+    return;
+  }
+  var chunk = store + '/' + Math.floor(key / EVIDENCE_CHUNK_SIZE);
+  if (chunk in evidenceChunks){
+    callback(evidenceChunks[chunk][key % EVIDENCE_CHUNK_SIZE]);
+  }
+  else{
+    d3.json('source/evidence/' + chunk + '.json', function(data){
+      evidenceChunks[chunk] = data;
+      callback(data[key % EVIDENCE_CHUNK_SIZE]);
+    });
+  }
+}
+
+// the evidence store referenced by the "evidence" attribute of a network
+function evidenceStore(data){
+  var store = null;
+  (data.graph || []).forEach(function(attr){
+    if (attr[0] == 'evidence'){
+      store = attr[1];
     }
-});
+  });
+  return store;
+}
 
 // load language data 
 var langByInfo = {};
@@ -61,6 +87,7 @@ coloring = typeof coloring !== 'undefined' ? coloring : 'Family';
 
 // open community file
 d3.json(filename, function(data){
+  var store = evidenceStore(data);
   // dictionary to convert IDs (node names) to numbers
   nodesById = {};
   for(var i=0; i < data.nodes.length; i++){
@@ -144,10 +171,7 @@ d3.json(filename, function(data){
 	  source : nodesById[data.adjacency[i][j].id],
 	  target : i,
 	  weight : scale(data.adjacency[i][j].FamilyWeight),
-	  families : data.adjacency[i][j].families,
-	  languages : data.adjacency[i][j].languages,
-	  words: data.adjacency[i][j].words,
-	  wofam: data.adjacency[i][j].wofam,
+	  evidence: data.adjacency[i][j].evidence,
 	  edge_width : 0.25 * data.adjacency[i][j].FamilyWeight // addon JML
 	});
       }
@@ -263,14 +287,13 @@ d3.json(filename, function(data){
     .on('mouseover',function(d,i){
       d3.selectAll('.link').style('stroke','#CCC').style('stroke-opacity',opacity/100);
       d3.select(this).style('stroke','OliveDrab').style('stroke-opacity',1);
+      withEvidence(store, d.evidence, function(wofam){
       d3.select("#info")
 	.html(function(){
-	  wofam = d.wofam.split(';');
-
 	  var infolist = [];
 	  for (_i=0; _i<wofam.length; _i++) {
-	    spl = wofam[_i].split('/');
-	    infolist.push([spl[4], linkByWords[spl[0]], spl[0], '?'+spl[0], 
+	    spl = wofam[_i];
+	    infolist.push([spl[4], [spl[2], spl[5]], spl[0], '?'+spl[0], 
 		langByInfo[spl[3]][0], 
 		langByInfo[spl[3]][5], 
 		langByInfo[spl[3]][6]])
@@ -348,6 +371,7 @@ d3.json(filename, function(data){
 	    infolistoutput.join('</tr><tr>') + "</tr></table>";
 	});
       d3.select('#info').classed('hidden',false)
+      });
     })
   .on('mouseout',function(d,i){
     //d3.select(this).style('stroke','#CCC');
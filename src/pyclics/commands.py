@@ -1,27 +1,30 @@
 # coding: utf8
 from __future__ import unicode_literals, print_function, division
-from collections import defaultdict
-from itertools import combinations, groupby
+from collections import defaultdict, OrderedDict
+from itertools import groupby
 import sqlite3
 from pathlib import Path
 import shutil
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 
-from tqdm import tqdm
-import geojson
 from clldutils.clilib import command, ParserError
-from clldutils.markup import Table
-from clldutils import jsonlib
-from pyconcepticon.api import Concepticon
-from pyglottolog.api import Glottolog
-from pylexibank.dataset import iter_datasets
-import networkx as nx
-from networkx.readwrite import json_graph
-from tabulate import tabulate
-
-from pyclics.util import full_colexification, networkx2igraph, get_denoted_concepts
 
 import pickle as p
 
+# Note: To keep the startup time of the `clics` command low, libraries which take long to import
+# (networkx, igraph, pylexibank, etc.) are only imported within the commands using them.
+
+
+def _require_sparse():
+    try:
+        import numpy  # noqa: F401
+        from scipy import sparse  # noqa: F401
+    except ImportError:
+        raise ParserError(
+            'computing with sparse matrices requires scipy - install it running '
+            '`pip install pyclics[sparse]`')
+
 
 @command('datasets')
 def list_(args):
@@ -29,7 +32,11 @@ def list_(args):
 
     clics --lexibank-repos=PATH/TO/lexibank-data list
     """
+    from clldutils.markup import Table
+
     if args.unloaded:
+        from pylexibank.dataset import iter_datasets
+
         i = 0
         for i, ds in enumerate(iter_datasets()):
             print(ds.cldf_dir)
@@ -38,20 +45,21 @@ def list_(args):
     else:
         table = Table(
             '#', 'Dataset', 'Glosses', 'Concepticon', 'Varieties', 'Glottocodes', 'Families')
+        db = args.api.readonly_db
         try:
-            concept_counts = {r[0]: r[1:] for r in args.api.db.fetchall('concepts_by_dataset')}
+            concept_counts = {r[0]: r[1:] for r in db.fetchall('concepts_by_dataset')}
         except sqlite3.OperationalError:  # pragma: no cover
             print('No datasets loaded yet')
             return
 
-        varieties = args.api.db.varieties
+        varieties = db.varieties
         var_counts = {}
         for dsid, vs in groupby(varieties, lambda v: v.source):
             vs = list(vs)
             var_counts[dsid] = (
                 len(vs), len(set(v.glottocode for v in vs)), len(set(v.family for v in vs)))
 
-        for count, d in enumerate(args.api.db.datasets):
+        for count, d in enumerate(db.datasets):
             table.append([
                 count + 1,
                 d.replace('lexibank-', ''),
@@ -65,7 +73,7 @@ def list_(args):
             '',
             'TOTAL',
             0,
-            args.api.db.fetchone(
+            db.fetchone(
                 """\
 select
     count(distinct p.concepticon_id) from parametertable as p, formtable as f, languagetable as l
@@ -85,7 +93,7 @@ where
 @command()
 def load(args):
     """
-    clics load /path/to/concepticon-data /path/to/glottolog
+    clics [--workers N] load /path/to/concepticon-data /path/to/glottolog
     """
     if len(args.args) != 2:
         raise ParserError('concepticon and glottolog repos locations must be specified!')
@@ -96,34 +104,178 @@ def load(args):
     if not glottolog.exists():
         raise ParserError('glottolog repository does not exist')
 
+    from pyconcepticon.api import Concepticon
+    from pyglottolog.api import Glottolog
+    from pylexibank.dataset import iter_datasets
+
     args.api.db.create(exists_ok=True)
     args.log.info('loading datasets into {0}'.format(args.api.db.fname))
     in_db = args.api.db.datasets
+    datasets = []
     for ds in iter_datasets():
         if args.unloaded and ds.id in in_db:
             args.log.info('skipping {0} - already loaded'.format(ds.id))
             continue
-        args.log.info('loading {0}'.format(ds.id))
-        args.api.db.load(ds)
+        datasets.append(ds)
+    with args.api.stage('datasets load', datasets=len(datasets)):
+        for dsid in args.api.db.load_datasets(datasets, workers=args.workers or 1):
+            args.log.info('loaded {0}'.format(dsid))
     args.log.info('loading Concepticon data')
-    args.api.db.load_concepticon_data(Concepticon(str(concepticon)))
+    with args.api.stage('concepticon data load'):
+        args.api.db.load_concepticon_data(Concepticon(str(concepticon)))
     args.log.info('loading Glottolog data')
-    args.api.db.load_glottolog_data(Glottolog(str(glottolog)))
+    with args.api.stage('glottolog data load'):
+        args.api.db.load_glottolog_data(Glottolog(str(glottolog)))
     return
 
 
+@command()
+def optimize(args):
+    """
+    Create the indexes used by CLICS, update statistics and compact the database.
+
+    clics optimize
+    """
+    from clldutils.markup import Table
+
+    db = args.api.db
+    if 'FormTable' not in db.tables:
+        print('No datasets loaded yet')
+        return
+    db.update_schema()
+    size = db.fname.stat().st_size
+    db.optimize()
+    args.log.info('optimized {0}: {1} -> {2} bytes'.format(
+        db.fname, size, db.fname.stat().st_size))
+
+    table = Table('Query', 'Table scans', 'Index scans', 'Index searches', 'Temp B-trees')
+    for query in ['varieties', 'wordlists', 'concept_occurrences']:
+        steps = db.query_plan(query)
+        table.append([
+            query,
+            len([s for s in steps if s.startswith('SCAN') and 'INDEX' not in s]),
+            len([s for s in steps if s.startswith('SCAN') and 'INDEX' in s]),
+            len([s for s in steps if s.startswith('SEARCH')]),
+            len([s for s in steps if 'TEMP B-TREE' in s]),
+        ])
+    print(table.render(tablefmt='simple'))
+
+
+@command('reindex-forms')
+def reindex_forms(args):
+    """
+    Recompute the normalized forms used to detect colexifications for all loaded forms.
+
+    clics reindex-forms
+    """
+    if 'FormTable' not in args.api.db.tables:
+        print('No datasets loaded yet')
+        return
+    args.log.info('{0} forms updated'.format(args.api.db.reindex_forms()))
+
+
+def _colexifications(db, varieties, compact=False):
+    """
+    Compute the colexifications for varieties which have been added or changed since the last
+    run, and aggregate the colexifications of all varieties per pair of concepts.
+
+    :param db: `Database` opened for writing.
+    :param compact: Flag signaling whether to return the compact representation of the aggregate.
+    :return: pair (`list` of updated varieties, `Colexifications` instance).
+    """
+    from pyclics.db import Database
+    from pyclics.util import Colexifications
+
+    updated = db.update_colexifications(varieties)
+    colexifications = Colexifications()
+    readonly_db = Database(db.fname, readonly=True)
+    try:
+        for variety, pairs in readonly_db.iter_colexifications(varieties):
+            colexifications.add(variety, pairs)
+    finally:
+        readonly_db.close()
+    return updated, colexifications.compact() if compact else colexifications
+
+
+def _aggregated_colexifications(args, varieties):
+    # Colexifications are computed and aggregated - possibly in multiple processes, each
+    # processing one chunk of consecutive languages - and merged in the order of languages. The
+    # aggregates are sent back in their compact representation, so they are cheap to pickle and
+    # to merge.
+    workers = args.workers or 1
+    if workers > 1:
+        from tqdm import tqdm
+        from pyclics.util import Colexifications, chunked
+
+        args.api.db.update_schema()
+        updated, colexifications = [], Colexifications()
+        chunks = chunked(varieties, workers)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for updated_, chunk in tqdm(
+                    executor.map(partial(_colexifications, args.api.db, compact=True), chunks),
+                    total=len(chunks),
+                    leave=False):
+                updated.extend(updated_)
+                colexifications.update(chunk)
+    else:
+        updated, colexifications = _colexifications(args.api.db, varieties)
+    args.log.info('computed colexifications for {0} of {1} varieties'.format(
+        len(updated), len(varieties)))
+    return colexifications
+
+
+EDGEFILTERS = ['families', 'languages', 'words']
+
+
+def _variants(args):
+    """
+    Determine the (threshold, edgefilter) pairs for which to compute networks.
+    """
+    if args.thresholds:
+        thresholds = []
+        for spec in args.thresholds.split(','):
+            start, _, end = spec.partition('-')
+            try:
+                thresholds.extend(range(int(start), int(end or start) + 1))
+            except ValueError:
+                raise ParserError(
+                    'invalid thresholds "{0}" - specify numbers or ranges, e.g. "1-3,5"'.format(
+                        args.thresholds))
+    else:
+        thresholds = [args.threshold or 1]
+    edgefilters = args.edgefilters.split(',') if args.edgefilters else [args.edgefilter]
+    for edgefilter in edgefilters:
+        if edgefilter not in EDGEFILTERS:
+            raise ParserError('invalid edge filter "{0}" - choose from {1}'.format(
+                edgefilter, ', '.join(EDGEFILTERS)))
+    return [(t, f) for f in edgefilters for t in thresholds]
+
+
+def _ignored_edges(edges, threshold, edgefilter):
+    i = EDGEFILTERS.index(edgefilter)
+    return {edge for edge, weights in edges.items() if weights[i] < threshold}
+
+
 @command()
 def colexification(args):
-    args.api._log = args.log
-    threshold = args.threshold or 1
-    edgefilter = args.edgefilter
-    words = {}
+    """
+    clics [-t 1] [-f families|languages|words] [--workers N] [--sparse] colexification
+
+    To compute networks for multiple thresholds and edge filters at once, use
+    clics --thresholds 1-3,5 --edgefilters families,words colexification
+    """
+    import geojson
+    import networkx as nx
+    from clldutils.markup import Table
 
-    def clean(word):
-        return ''.join([w for w in word if w not in '/,;"'])
+    if args.sparse:
+        _require_sparse()
+    variants = _variants(args)
 
     # Get data about languages
-    varieties = args.api.db.varieties # Create list of languages
+    with args.api.stage('db fetch') as stage:
+        varieties = args.api.readonly_db.varieties # Create list of languages
+        stage.count(varieties=len(varieties))
     lgeo = geojson.FeatureCollection([v.as_geojson() for v in varieties]) # Generate geoJSON
     args.api.json_dump(lgeo, 'app', 'source', 'langsGeo.json') # Save geoJSON
 
@@ -136,89 +288,86 @@ def colexification(args):
 
     # Begin generating graph. Create a node for each concept
     args.log.info('Adding nodes to the graph')
-    G = nx.Graph()
-    for concept in args.api.db.iter_concepts():
-        G.add_node(concept.id, **concept.as_node_attrs())
+    with args.api.stage('db fetch') as stage:
+        nodes = [
+            (concept.id, concept.as_node_attrs())
+            for concept in args.api.readonly_db.iter_concepts()]
+        stage.count(concepts=len(nodes))
 
     # Add edges between the concepts if they are colexified in enough languages/families
     args.log.info('Adding edges to the graph')
-    # Iterate over languages
-    for v_, forms in tqdm(args.api.db.iter_wordlists(varieties), total=len(varieties), leave=False):
-        # Compute all colexifications for the next language
-        # full_colexifications returns a dict with the clics_forms for keys,
-        # and a list of concepts for each form as values
-        cols = full_colexification(forms)
-
-        for _, v in cols.items():
-            for formA, formB in combinations(v, r=2):
-                # If the two words are not just synonyms/word variants...
-                if formA.concepticon_id != formB.concepticon_id:
-                    # ... then add them to the 'words' dict
-                    words[formA.gid] = [formA.clics_form, formA.form]
-                    # If the edge isn't already in the graph...
-                    if not G[formA.concepticon_id].get(formB.concepticon_id, False):
-                        # ... add it
-                        G.add_edge(
-                            formA.concepticon_id,
-                            formB.concepticon_id,
-                            words=set(),
-                            languages=set(),
-                            families=set(),
-                            wofam=[],
-                        )
-
-                    # The edge was either already here or has been added. Now update
-                    # its attributes
-                    G[formA.concepticon_id][formB.concepticon_id]['words'].add(
-                        (formA.gid, formB.gid))
-                    G[formA.concepticon_id][formB.concepticon_id]['languages'].add(v_.gid)
-                    G[formA.concepticon_id][formB.concepticon_id]['families'].add(v_.family)
-                    G[formA.concepticon_id][formB.concepticon_id]['wofam'].append('/'.join([
-                        formA.gid,
-                        formB.gid,
-                        formA.clics_form,
-                        v_.gid,
-                        v_.family,
-                        clean(formA.form),
-                        clean(formB.form)]))
-    args.api.json_dump(words, 'app', 'source', 'words.json')
-
-    edges = {}
-    for edgeA, edgeB, data in G.edges(data=True):
-        edges[edgeA, edgeB] = (len(data['families']), len(data['languages']), len(data['words']))
-
-    ignore_edges = []
-    for edgeA, edgeB, data in G.edges(data=True):
-        data['WordWeight'] = len(data['words'])
-        data['words'] = ';'.join(sorted(['{0}/{1}'.format(x, y) for x, y in data['words']]))
-        data['FamilyWeight'] = len(data['families'])
-        data['families'] = ';'.join(sorted(data['families']))
-        data['LanguageWeight'] = len(data['languages'])
-        data['languages'] = ';'.join(data['languages'])
-        data['wofam'] = ';'.join(data['wofam'])
-        if edgefilter == 'families' and data['FamilyWeight'] < threshold:
-            ignore_edges.append((edgeA, edgeB))
-        elif edgefilter == 'languages' and data['LanguageWeight'] < threshold:
-            ignore_edges.append((edgeA, edgeB))
-        elif edgefilter == 'words' and data['WordWeight'] < threshold:
-            ignore_edges.append((edgeA, edgeB))
-
-    G.remove_edges_from(ignore_edges)
-
-    nodenames = {r[0]: r[1] for r in args.api.db.fetchall(
-        "select distinct concepticon_id, concepticon_gloss from parametertable")}
+    graph_attrs = OrderedDict()
+    if args.sparse:
+        from pyclics.util import colexification_weights
+
+        # Only compute the edge weights, using sparse matrix products:
+        with args.api.stage('pair enumeration') as stage:
+            weights = colexification_weights(
+                args.api.readonly_db.iter_concept_forms(varieties))
+            stage.count(edges=len(weights))
+
+        def edge_attrs(edgeA, edgeB):
+            fc, lc, wc = edges[edgeA, edgeB]
+            return OrderedDict([('WordWeight', wc), ('FamilyWeight', fc), ('LanguageWeight', lc)])
+    else:
+        with args.api.stage('pair enumeration') as stage:
+            colexifications = _aggregated_colexifications(args, varieties)
+            weights = colexifications.weights()
+            stage.count(edges=len(weights))
+        # The evidence for the edges is stored separately - in a store referenced by the
+        # networks - and referenced by edge ID:
+        graph_attrs['evidence'] = colexifications.digest()[:16]
+        with args.api.stage('evidence export', edges=len(weights)):
+            args.api.evidence_export(
+                colexifications.evidence(), graph_attrs['evidence'], workers=args.workers or 1)
+        edge_attrs = colexifications.edge_attrs
+
+    def graph(ignore_edges):
+        G = nx.Graph(**graph_attrs)
+        G.add_nodes_from(nodes)
+        # Add all edges, to determine the order in which they are exported ...
+        G.add_edges_from(weights)
+        # ... but only create the attributes for edges passing the threshold. Attributes are
+        # created per variant, so they can be released once the variant has been written:
+        for edgeA, edgeB in edges:
+            if (edgeA, edgeB) not in ignore_edges:
+                G[edgeA][edgeB].update(edge_attrs(edgeA, edgeB))
+        G.remove_edges_from(ignore_edges)
+        return G
 
-    table = Table('ID A', 'Concept A', 'ID B', 'Concept B', 'Families', 'Languages', 'Words')
-    count = 0
-    for (nodeA, nodeB), (fc, lc, wc) in sorted(edges.items(), key=lambda i: i[1], reverse=True):
-        if (nodeA, nodeB) not in ignore_edges:
-            table.append([nodeA, nodenames[nodeA], nodeB, nodenames[nodeB], fc, lc, wc])
-            count += 1
-        if count >= 10:
-            break
-    print(table.render(tablefmt='simple'))
+    G = nx.Graph()
+    G.add_nodes_from(node for node, _ in nodes)
+    G.add_edges_from(weights)
+    edges = OrderedDict()
+    for edgeA, edgeB in G.edges():
+        edges[edgeA, edgeB] = weights.get((edgeA, edgeB)) or weights[edgeB, edgeA]
 
-    args.api.save_graph(G, args.graphname or 'network', threshold, edgefilter)
+    nodenames = {r[0]: r[1] for r in args.api.readonly_db.fetchall(
+        "select distinct concepticon_id, concepticon_gloss from parametertable")}
+    ranked = sorted(edges.items(), key=lambda i: i[1], reverse=True)
+
+    def graphs():
+        for threshold, edgefilter in variants:
+            with args.api.stage('threshold filter', threshold=threshold) as stage:
+                ignore_edges = _ignored_edges(edges, threshold, edgefilter)
+                G = graph(ignore_edges)
+                stage.count(edges=G.number_of_edges())
+            table = Table(
+                'ID A', 'Concept A', 'ID B', 'Concept B', 'Families', 'Languages', 'Words')
+            for (nodeA, nodeB), (fc, lc, wc) in ranked:
+                if (nodeA, nodeB) not in ignore_edges:
+                    table.append([nodeA, nodenames[nodeA], nodeB, nodenames[nodeB], fc, lc, wc])
+                if len(table) >= 10:
+                    break
+            if len(variants) > 1:
+                print('\nThreshold {0}, edge filter {1}:'.format(threshold, edgefilter))
+            print(table.render(tablefmt='simple'))
+            yield threshold, edgefilter, G
+            # The variant has been written, so we release it before computing the next one:
+            del G
+
+    # Writing the networks for multiple variants can be spread over multiple processes:
+    args.api.save_graphs(graphs(), args.graphname or 'network', workers=args.workers or 1)
 
 
 @command('articulation-points')
@@ -249,7 +398,8 @@ def articulationpoints(args):
     paramters are used to identify a given analysis by its filename and make
     sure the correct graph is loaded.
     """
-    args.api._log = args.log
+    import networkx as nx
+
     threshold = args.threshold or 1
 
     graph = args.api.load_graph('infomap', threshold, args.edgefilter)
@@ -278,69 +428,45 @@ def articulationpoints(args):
 
 @command()
 def subgraph(args, neighbor_weight=None):
-    args.api._log = args.log
+    from tqdm import tqdm
+    from pyclics.util import OutEdges, Adjacency, subgraph_names, subgraph_payload
+
     graphname = args.graphname or 'network'
     threshold = args.threshold or 1
     edgefilter = args.edgefilter
     neighbor_weight = neighbor_weight or 5
 
     _graph = args.api.load_graph(graphname, threshold, edgefilter)
-    for node, data in _graph.nodes(data=True):
-        generations = [{node}]
-        while generations[-1] and len(set.union(*generations)) < 30 and len(generations) < 3:
-            nextgen = set.union(*[set(_graph[n].keys()) for n in generations[-1]])
-            if len(nextgen) > 50:
-                break  # pragma: no cover
-            else:
-                generations.append(set.union(*[set(_graph[n].keys()) for n in generations[-1]]))
-        data['subgraph'] = list(set.union(*generations))
+    # Nodes with identical neighbourhoods share the same tuple of nodes:
+    with args.api.stage('neighbourhoods', nodes=len(_graph)):
+        neighbourhoods = Adjacency(_graph).neighbourhoods(
+            max_size=30, max_generation=50, generations=3)
+    for (node, data), nodes in zip(_graph.nodes(data=True), neighbourhoods):
+        data['subgraph'] = list(nodes)
 
     args.api.save_graph(_graph, 'subgraph', threshold, edgefilter)
-
-    outdir = args.api.existing_dir('app', 'subgraph', clean=True)
-    cluster_names = {}
-    nodes2cluster = {}
-    nidx = 1
-    for node, data in tqdm(
-            sorted(_graph.nodes(data=True), key=lambda x: len(x[1]['subgraph']), reverse=True),
-            leave=False):
-        nodes = tuple(sorted(data['subgraph']))
-        sg = _graph.subgraph(data['subgraph'])
-        if nodes not in nodes2cluster:
-            d_ = sorted(sg.degree(), key=lambda x: x[1], reverse=True)
-            d = [_graph.node[a]['Gloss'] for a, b in d_][0]
-            nodes2cluster[nodes] = 'subgraph_{0}_{1}'.format(nidx, d)
-            nidx += 1
-        cluster_name = nodes2cluster[nodes]
-        data['ClusterName'] = cluster_name
-        for n, d in sg.nodes(data=True):
-            d['OutEdge'] = []
-            neighbors = [
-                n_ for n_ in _graph if
-                n_ in _graph[node] and
-                _graph[node][n_]['FamilyWeight'] >= neighbor_weight and
-                n_ not in sg]
-            if neighbors:
-                sg.node[node]['OutEdge'] = []
-                for n_ in neighbors:
-                    sg.node[node]['OutEdge'].append([
-                        'subgraph_' + n_ + '_' + _graph.node[n]['Gloss'],
-                        _graph.node[n_]['Gloss'],
-                        _graph.node[n_]['Gloss'],
-                        _graph[node][n_]['FamilyWeight'],
-                        n_
-                    ])
-                    sg.node[node]['OutEdge'].append([
-                        _graph.node[n]['ClusterName'],
-                        _graph.node[n]['CentralConcept'],
-                        _graph.node[n]['Gloss'],
-                        _graph[node][n]['WordWeight'],
-                        n
-                    ])
-        if len(sg) > 1:
-            jsonlib.dump(
-                json_graph.adjacency_data(sg), outdir / (cluster_name + '.json'), sort_keys=True)
-            cluster_names[data['Gloss']] = cluster_name
+    if not args.export:
+        return
+
+    with args.api.stage('subgraph export') as stage:
+        cluster_names, subgraphs = {}, OrderedDict()
+        out_edges = OutEdges(_graph, neighbor_weight)
+        for (node, data), nodes, cluster_name in zip(
+                _graph.nodes(data=True), neighbourhoods, subgraph_names(_graph, neighbourhoods)):
+            data['ClusterName'] = cluster_name
+            if len(nodes) > 1:
+                # Nodes with identical neighbourhoods share one subgraph, which is exported
+                # with the out edges of the last of these nodes:
+                subgraphs[cluster_name] = (node, nodes)
+                cluster_names[data['Gloss']] = cluster_name
+
+        args.api.json_export(
+            (
+                (name + '.json', subgraph_payload(_graph, node, nodes, out_edges))
+                for name, (node, nodes) in tqdm(subgraphs.items(), leave=False)),
+            'app', 'subgraph',
+            workers=args.workers or 1)
+        stage.count(subgraphs=len(subgraphs))
 
     for node, data in _graph.nodes(data=True):
         if 'OutEdge' in data:
@@ -350,6 +476,9 @@ def subgraph(args, neighbor_weight=None):
 
 @command()
 def communities(args, neighbor_weight=None):
+    from tqdm import tqdm
+    from pyclics.util import networkx2igraph, OutEdges, cluster_payload
+
     graphname = args.graphname or 'network'
     edge_weights = args.weight
     vertex_weights = str('FamilyFrequency')
@@ -373,12 +502,16 @@ def communities(args, neighbor_weight=None):
         edge_weights = 'weight'
         args.log.info('computed weights')
 
-    graph = networkx2igraph(_graph)
+    with args.api.stage(
+            'igraph conversion', nodes=len(_graph), edges=_graph.number_of_edges()):
+        graph = networkx2igraph(_graph)
     args.log.info('starting infomap')
     args.log.info('converted graph...')
 
-    comps = graph.community_infomap(
-        edge_weights=str(edge_weights), vertex_weights=vertex_weights)
+    with args.api.stage('infomap') as stage:
+        comps = graph.community_infomap(
+            edge_weights=str(edge_weights), vertex_weights=vertex_weights)
+        stage.count(communities=len(comps))
 
     args.log.info('finished infomap')
     D, Com = {}, defaultdict(list)
@@ -409,37 +542,25 @@ def communities(args, neighbor_weight=None):
 
     args.log.info('computed cluster names')
 
-    cluster_dir = args.api.existing_dir('app', 'cluster', clean=True)
-    cluster_names = {}
-    removed = []
-    for idx, nodes in tqdm(sorted(Com.items()), desc='export to app', leave=False):
-        sg = _graph.subgraph(nodes)
-        for node, data in sg.nodes(data=True):
-            data['OutEdge'] = []
-            neighbors = [
-                n for n in _graph if
-                n in _graph[node] and
-                _graph[node][n]['FamilyWeight'] >= neighbor_weight and
-                n not in sg]
-            if neighbors:
-                sg.node[node]['OutEdge'] = []
-                for n in neighbors:
-                    sg.node[node]['OutEdge'].append([
-                        _graph.node[n]['ClusterName'],
-                        _graph.node[n]['CentralConcept'],
-                        _graph.node[n]['Gloss'],
-                        _graph[node][n]['WordWeight'],
-                        n
-                    ])
-        if len(sg) > 1:
-            jsonlib.dump(
-                json_graph.adjacency_data(sg),
-                cluster_dir / (_graph.node[nodes[0]]['ClusterName'] + '.json'),
-                sort_keys=True)
-            for node in nodes:
-                cluster_names[_graph.node[node]['Gloss']] = _graph.node[node]['ClusterName']
-        else:
-            removed += [list(nodes)[0]]
+    with args.api.stage('cluster export') as stage:
+        cluster_names = {}
+        removed = []
+        exports = []
+        out_edges = OutEdges(_graph, neighbor_weight)
+        for idx, nodes in tqdm(sorted(Com.items()), desc='export to app', leave=False):
+            # The payload is computed in any case, because it sets the OutEdge attribute saved
+            # with the infomap graph:
+            payload = cluster_payload(_graph, nodes, out_edges)
+            if len(payload['nodes']) > 1:
+                if args.export:
+                    exports.append((_graph.node[nodes[0]]['ClusterName'] + '.json', payload))
+                for node in nodes:
+                    cluster_names[_graph.node[node]['Gloss']] = _graph.node[node]['ClusterName']
+            else:
+                removed += [list(nodes)[0]]
+        if args.export:
+            args.api.json_export(exports, 'app', 'cluster', workers=args.workers or 1)
+        stage.count(clusters=len(set(cluster_names.values())))
     _graph.remove_nodes_from(removed)
     for node, data in _graph.nodes(data=True):
         if 'OutEdge' in data:
@@ -451,11 +572,30 @@ def communities(args, neighbor_weight=None):
     _graph.remove_edges_from(removed)
 
     args.api.save_graph(_graph, 'infomap', threshold, edgefilter)
-    args.api.write_js_var('INFO', cluster_names, 'app', 'source', 'infomap-names.js')
+    if args.export:
+        args.api.write_js_var('INFO', cluster_names, 'app', 'source', 'infomap-names.js')
+
+
+@command()
+def serve(args):
+    """
+    Serve the CLICS app, computing the data for clusters and subgraphs on demand.
+
+    clics [-t 1] [-f families] [-g network] serve [PORT]
+    """
+    from pyclics.server import AppServer
+
+    port = int(args.args[0]) if args.args else 8000
+    server = AppServer(
+        args.api, args.threshold or 1, args.edgefilter, graphname=args.graphname or 'network')
+    args.log.info('serving the CLICS app at http://127.0.0.1:{0}/'.format(port))
+    server.serve_forever(port=port)
 
 
 @command('graph-stats')
 def graph_stats(args):
+    from tabulate import tabulate
+
     nw = args.api.load_network(args.graphname or 'network', args.threshold or 1, args.edgefilter)
     graph = nw.graph
     print(tabulate([
@@ -470,74 +610,61 @@ def create_lang_graph(args):
     """Generate a graph of languages joined by colexifications in common.
 
     e.g. clics -t 5 -g new_graph create-language-graph
+
+    Note: The graph is computed with sparse matrices, which requires `scipy`.
     """
+    import networkx as nx
+    from tqdm import tqdm
+    from pyclics.util import LanguageColexifications
 
-    args.api._log = args.log
+    _require_sparse()
     threshold = args.threshold or 1
-    colex_features = defaultdict(set)
 
     # Get language data
-    varieties = args.api.db.varieties # Create list of languages
+    with args.api.stage('db fetch') as stage:
+        varieties = args.api.readonly_db.varieties # Create list of languages
+        stage.count(varieties=len(varieties))
 
     # Begin generating graph. Create a node for each language
     args.log.info('Adding nodes to the graph')
     G = nx.Graph()
     for variety in varieties:
         G.add_node((variety.gid), **variety.as_node_attrs())
-    
-    # Loop through languages, storing them at relevant places in the combined dict
-    args.log.info('Extracting colexifications from languages')
-    for variety, forms in tqdm(args.api.db.iter_wordlists(varieties), total=len(varieties), leave=False):
-        # var is a Variety object, giving the language's info from LanguageTable
-        # forms is a list of Form objects each representing a row from FormTable
-
-        # Extract language id as a hashable
-        lang = variety.gid
 
-        # Calculate all colexifications for this language
-        cons = get_denoted_concepts(forms)
-
-        for _, v in cons.items():
-            # Each time this language colexifies two concepts ...
-            for (conceptA, conceptB) in combinations(v, r=2):
-                # ... add the language to the dict of colexifications
-                colex_features[(conceptA, conceptB)].add(lang)
+    # Collect the colexifications of each language in a sparse language x colexification matrix
+    args.log.info('Extracting colexifications from languages')
+    with args.api.stage('colexification matrix') as stage:
+        colexifications = LanguageColexifications(tqdm(
+            args.api.readonly_db.iter_concept_forms(varieties),
+            total=len(varieties),
+            leave=False))
+        stage.count(colexifications=len(colexifications.colexifications))
 
     # Save colexification data:
-    args.api.json_dump({'-'.join(key):value for key,value in colex_features}, 'lang_graphs', 'all_colexifications.json')
+    args.api.json_dump(
+        OrderedDict(
+            ('-'.join(colex), [v.gid for v in langs])
+            for colex, langs in colexifications.languages().items()),
+        'lang_graphs',
+        'all_colexifications.json')
 
     args.log.info('Adding edges to graph')
-    # Consider each colexification in turn
-    for colex, langs in tqdm(colex_features.items(), total=len(colex_features), leave = False):
-        # colex is a tuple of form (conceptA, conceptB)
-        # langs is a set of tuples of form (source, id)
-
-        for langA, langB in combinations(langs, r = 2):
-            # Check that the edge isn't already in the graph
-            if not G[langA].get(langB, False):
-                # ... if it isn't, add it
-                G.add_edge(
-                    langA,
-                    langB,
-                    colexifications=set(),
-                    weight=int()
-                )
-
-            # Record the colexification as an edge attribute
-            G[langA][langB]['colexifications'].add(colex)
-            G[langA][langB]['weight'] += 1
-
-    # Apply threshold and reformat data for export
-    ignore_edges = []
-    for nodeA, nodeB, data in G.edges(data=True):
-        # Concatenate each colexification tuple
-        data['colexifications'] = ['='.join(tup) for tup in data['colexifications']]
-        # Concatenate the list of all colexifications
-        data['colexifications'] = ','.join(data['colexifications'])
-        if data['weight'] < threshold:
-            ignore_edges.append((nodeA, nodeB))
-
-    G.remove_edges_from(ignore_edges)
+    # The number of colexifications shared by two languages is computed as sparse matrix product,
+    # and only edges passing the threshold are added to the graph. The shared colexifications
+    # are not stored with the edges, but can be looked up in the evidence store:
+    with args.api.stage('threshold filter', threshold=threshold) as stage:
+        edges = []
+        for edge_id, (i, j, weight) in enumerate(colexifications.weights(threshold), start=1):
+            G.add_edge(
+                colexifications.varieties[i].gid,
+                colexifications.varieties[j].gid,
+                weight=weight,
+                evidence=edge_id)
+            edges.append((edge_id, i, j, weight))
+        stage.count(edges=len(edges))
+    with args.api.stage('evidence store write', edges=len(edges)):
+        args.api.file_written(args.api.lang_graph_evidence(
+            args.graphname or 'language-graph', threshold).write(colexifications, edges))
 
     args.api.save_lang_graph(
         graph = G,
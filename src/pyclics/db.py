@@ -1,24 +1,81 @@
 # coding: utf8
+import os
 import string
+import sqlite3
+import tempfile
+from contextlib import contextmanager, closing
+from collections import deque, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from pathlib import Path
 
 from unidecode import unidecode
 from pylexibank.db import Database as Database_
 
 from pyclics.models import Form, Concept, Variety
+from pyclics.util import colexified_pairs
 
-__all__ = ['Database']
+__all__ = ['Database', 'EvidenceStore']
 
 # unidecode converts "ə" to "@"
 ALLOWED_CHARACTERS = string.ascii_letters + string.digits + '@'
 
 
+class _Translation(dict):
+    """
+    A translation table for `str.translate`, which computes - and memoizes - the CLICS
+    normalization of characters as they are encountered.
+
+    Since `unidecode` transliterates character by character, translating a word character
+    by character gives the same result as normalizing the whole word at once.
+    """
+    def __missing__(self, key):
+        self[key] = ''.join(
+            c for c in unidecode(chr(key)) if c in ALLOWED_CHARACTERS).lower()
+        return self[key]
+
+
+_TRANSLATION = _Translation()
+
+
 def clics_form(word):
-    return ''.join(c for c in unidecode(word) if c in ALLOWED_CHARACTERS).lower()
+    return word.translate(_TRANSLATION)
+
+
+def clics_forms(words):
+    """
+    Normalize a batch of forms.
+
+    :param words: iterable of forms.
+    :return: `list` of the corresponding CLICS forms.
+    """
+    return [word.translate(_TRANSLATION) for word in words]
+
+
+@contextmanager
+def _reused(conn):
+    yield conn
+
+
+def _load_scratch(fname, dataset_class):
+    """
+    Load a dataset into a scratch database.
+    """
+    db = Database(fname)
+    db.create(force=True)
+    db.load(dataset_class())
+    return fname
 
 
 class Database(Database_):
     """
     The CLICS database adds a column `clics_form` to lexibank's FormTable.
+
+    A `Database` opened with `readonly=True` uses one connection - opened in read-only mode
+    and tuned for repeated scans of large tables - for all queries, which must be closed by
+    calling `Database.close`. Since databases are switched to write-ahead logging when the
+    schema is created or updated, analyses can run concurrently with a process writing to the
+    database.
     """
     Database_.sql["concepts_by_dataset"] = """\
 SELECT
@@ -28,31 +85,7 @@ FROM
 WHERE
     ds.id = p.dataset_id and f.dataset_id = ds.id and f.parameter_id = p.id
 GROUP BY ds.id"""
-
-    @property
-    def datasets(self):
-        return sorted(r[0] for r in self.fetchall("select id from dataset"))
-
-    def update_schema(self):
-        Database_.update_schema(self)
-        for tname, cname, type_ in [
-            ('FormTable', 'clics_form', 'TEXT'),
-        ]:
-            if cname not in self.tables[tname]:
-                with self.connection() as conn:
-                    conn.execute("ALTER TABLE {0} ADD COLUMN `{1}` {2}".format(
-                        tname, cname, type_))
-
-    def update_row(self, table, keys, values):
-        if table == 'FormTable':
-            d = dict(zip(keys, values))
-            keys = list(keys) + ['`clics_form`']
-            values = list(values) + [clics_form(d['`Form`'])]
-        return keys, values
-
-    @property
-    def varieties(self):
-        return [Variety(*row) for row in self.fetchall("""\
+    Database_.sql["varieties"] = """\
 select
     l.id, l.dataset_id, l.name, l.glottocode, l.family, l.macroarea, l.longitude, l.latitude
 from
@@ -66,13 +99,10 @@ where
 group by
     l.id, l.dataset_id
 order by
-    l.dataset_id, l.id""")]
-
-    def iter_wordlists(self, varieties):
-        languages = {(v.source, v.id): v for v in varieties}
-        for (dsid, vid), v in sorted(languages.items()):
-            forms = [Form(*row) for row in self.fetchall("""
+    l.dataset_id, l.id"""
+    Database_.sql["wordlists"] = """\
 select
+    f.dataset_id, f.language_id,
     f.id, f.dataset_id, f.form, f.clics_form,
     p.name, p.concepticon_id, p.concepticon_gloss, p.ontological_category, p.semantic_field
 from
@@ -81,52 +111,459 @@ where
     f.parameter_id = p.id
     and f.dataset_id = p.dataset_id
     and p.concepticon_id is not null
-    and f.language_id = ?
-    and f.dataset_id = ?
 order by
-    f.dataset_id, f.language_id, p.concepticon_id
-""", params=(vid, dsid))]
-            assert forms
-            yield v, forms
-
-    def _lids_by_concept(self):
-        return {r[0]: sorted(set(r[1].split())) for r in self.fetchall("""\
+    f.dataset_id, f.language_id, p.concepticon_id"""
+    Database_.sql["variety_wordlist"] = """\
 select
-    p.concepticon_id, group_concat(f.dataset_id || '-' || f.language_id, ' ')
+    f.id, f.dataset_id, f.form, f.clics_form,
+    p.name, p.concepticon_id, p.concepticon_gloss, p.ontological_category, p.semantic_field
 from
-    parametertable as p, formtable as f
+    formtable as f, parametertable as p
 where
-    f.parameter_id = p.id and f.dataset_id = p.dataset_id
+    f.dataset_id = ?
+    and f.language_id = ?
+    and f.parameter_id = p.id
+    and f.dataset_id = p.dataset_id
+    and p.concepticon_id is not null
+order by
+    p.concepticon_id"""
+    # Cheap fingerprints of the data of each dataset, computed from the covering index on
+    # FormTable:
+    Database_.sql["dataset_fingerprints"] = """\
+select
+    ds.id,
+    ifnull(ds.version, '') || ':' || count(f.rowid) || ':' || ifnull(max(f.rowid), '')
+from
+    dataset as ds
+    left join formtable as f on f.dataset_id = ds.id
 group by
-    p.concepticon_id
-""")}
-
-    def _fids_by_concept(self):
-        return {r[0]: sorted(set(r[1].split('|') if r[1] else '')) for r in self.fetchall("""\
+    ds.id"""
+    Database_.sql["concept_occurrences"] = """\
 select
-    p.concepticon_id, group_concat(l.family, '|')
+    p.concepticon_id, f.dataset_id || '-' || f.language_id, l.family, f.dataset_id || '-' || f.id
 from
-    parametertable as p, formtable as f, languagetable as l
+    parametertable as p
+    join formtable as f on f.parameter_id = p.id and f.dataset_id = p.dataset_id
+    left join languagetable as l on f.language_id = l.id and f.dataset_id = l.dataset_id
 where
-    f.parameter_id = p.id
-    and f.dataset_id = p.dataset_id
-    and f.language_id = l.id
-    and f.dataset_id = l.dataset_id
-group by
-    p.concepticon_id
-""")}
+    p.concepticon_id is not null
+order by
+    p.concepticon_id"""
+
+    # Indexes covering the join keys used by the analysis queries.
+    indexes = [
+        ('clics_form_language', 'FormTable', ['dataset_ID', 'Language_ID', 'Parameter_ID']),
+        ('clics_form_parameter', 'FormTable', ['dataset_ID', 'Parameter_ID', 'Language_ID', 'ID']),
+        ('clics_parameter_concepticon', 'ParameterTable', ['Concepticon_ID', 'dataset_ID', 'ID']),
+    ]
+
+    # Colexifications computed per variety, together with the fingerprint of the dataset they
+    # were computed from. Since both tables have a `dataset_ID` column, the rows for a dataset
+    # are removed when the dataset is (re-)loaded.
+    colexification_tables = [
+        """\
+CREATE TABLE IF NOT EXISTS clics_wordlist (
+    dataset_ID TEXT NOT NULL,
+    Language_ID TEXT NOT NULL,
+    fingerprint TEXT,
+    PRIMARY KEY (dataset_ID, Language_ID)
+)""",
+        """\
+CREATE TABLE IF NOT EXISTS clics_colexification (
+    dataset_ID TEXT NOT NULL,
+    Language_ID TEXT NOT NULL,
+    ID INTEGER NOT NULL,
+    clics_form TEXT,
+    Form_A_ID TEXT,
+    Form_A TEXT,
+    Concepticon_ID_A TEXT,
+    Form_B_ID TEXT,
+    Form_B TEXT,
+    Concepticon_ID_B TEXT,
+    PRIMARY KEY (dataset_ID, Language_ID, ID)
+)""",
+    ]
+
+    # Seconds to wait for locks held by other connections - e.g. during WAL checkpoints:
+    busy_timeout = 60
+
+    readonly_pragmas = [
+        'query_only = ON',
+        'mmap_size = 268435456',
+        'cache_size = -65536',
+        'temp_store = MEMORY',
+    ]
+
+    def __init__(self, fname, readonly=False):
+        Database_.__init__(self, fname)
+        self.readonly = readonly
+        self._connection = None
+
+    def __getstate__(self):
+        # Connections cannot be shared between processes.
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        return state
+
+    def connection(self):
+        if not self.readonly:
+            return closing(sqlite3.connect(str(self.fname), timeout=self.busy_timeout))
+        if self._connection is None:
+            uri = '{0}?mode=ro'.format(self.fname.resolve().as_uri())
+            if not os.access(str(self.fname.parent), os.W_OK):
+                # Reading a database in WAL mode requires creating a shared-memory file next to
+                # it - which is not possible (and not needed, since nobody can write to the
+                # database there) in a read-only directory.
+                uri += '&immutable=1'
+            self._connection = sqlite3.connect(uri, uri=True, timeout=self.busy_timeout)
+            for pragma in self.readonly_pragmas:
+                self._connection.execute('PRAGMA {0}'.format(pragma))
+        return _reused(self._connection)
+
+    def close(self):
+        """
+        Close the connection of a read-only database.
+        """
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+            # The write-ahead log is only checkpointed and removed by the last connection to
+            # close - if it can write to the database:
+            if Path(str(self.fname) + '-wal').exists() and \
+                    os.access(str(self.fname.parent), os.W_OK):
+                with closing(sqlite3.connect(str(self.fname), timeout=self.busy_timeout)) as conn:
+                    conn.execute('PRAGMA schema_version')
 
-    def _wids_by_concept(self):
-        return {r[0]: sorted(set(r[1].split())) for r in self.fetchall("""\
+    def _use_wal(self, conn):
+        # In WAL mode, readers don't block the writer - and vice versa. The journal mode is
+        # persistent, i.e. stored in the database file.
+        conn.execute('PRAGMA journal_mode = WAL')
+
+    def create(self, force=False, exists_ok=False):
+        exists = self.fname.exists()
+        Database_.create(self, force=force, exists_ok=exists_ok)
+        if force or not exists:
+            with self.connection() as conn:
+                self._use_wal(conn)
+
+    @property
+    def datasets(self):
+        return sorted(r[0] for r in self.fetchall("select id from dataset"))
+
+    def update_schema(self):
+        Database_.update_schema(self)
+        for tname, cname, type_ in [
+            ('FormTable', 'clics_form', 'TEXT'),
+        ]:
+            if cname not in self.tables[tname]:
+                with self.connection() as conn:
+                    conn.execute("ALTER TABLE {0} ADD COLUMN `{1}` {2}".format(
+                        tname, cname, type_))
+        with self.connection() as conn:
+            self._use_wal(conn)
+            for sql in self.colexification_tables:
+                conn.execute(sql)
+            for name, tname, cnames in self.indexes:
+                conn.execute("CREATE INDEX IF NOT EXISTS {0} ON {1} ({2})".format(
+                    name, tname, ', '.join('`{0}`'.format(c) for c in cnames)))
+            conn.commit()
+
+    def reindex_forms(self, chunksize=10000):
+        """
+        Recompute the `clics_form` of all forms in the database.
+
+        Forms are processed in chunks of `chunksize` rows, each updated in one transaction.
+        Stored colexifications of datasets with changed forms are invalidated.
+
+        :return: The number of forms for which `clics_form` has changed.
+        """
+        self.update_schema()
+        changed, last = 0, 0
+        with self.connection() as conn:
+            while True:
+                rows = conn.execute(
+                    "SELECT rowid, `Form`, clics_form, dataset_ID FROM FormTable "
+                    "WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (last, chunksize)).fetchall()
+                if not rows:
+                    break
+                last = rows[-1][0]
+                updates, datasets = [], set()
+                for row, new in zip(rows, clics_forms(row[1] or '' for row in rows)):
+                    if new != row[2]:
+                        updates.append((new, row[0]))
+                        datasets.add(row[3])
+                conn.executemany("UPDATE FormTable SET clics_form = ? WHERE rowid = ?", updates)
+                conn.executemany(
+                    "DELETE FROM clics_wordlist WHERE dataset_ID = ?",
+                    [(dsid,) for dsid in sorted(datasets)])
+                conn.commit()
+                changed += len(updates)
+        return changed
+
+    def optimize(self):
+        """
+        Update the statistics used by SQLite's query planner and compact the database file.
+        """
+        with self.connection() as conn:
+            conn.execute('ANALYZE')
+            conn.commit()
+            conn.execute('VACUUM')
+
+    def query_plan(self, sql):
+        """
+        :return: `list` of the steps SQLite's query planner chose to run a (named) query.
+        """
+        return [r[3] for r in self.fetchall('EXPLAIN QUERY PLAN ' + self.sql.get(sql, sql))]
+
+    def merge(self, fname):
+        """
+        Copy the data of another database - e.g. a scratch database written by `Database.load`
+        - into this database, replacing data of datasets with the same IDs.
+
+        The schema is extended with the tables and columns of the other database, and all rows
+        are copied in one transaction.
+
+        :param fname: Path of the database file to merge.
+        :return: `list` of the IDs of the datasets merged.
+        """
+        other = Database(fname)
+        dataset_ids = sorted(r[0] for r in other.fetchall("select ID from dataset"))
+        self.create(exists_ok=True)
+        for dataset_id in dataset_ids:
+            self.unload(dataset_id)
+
+        # update the DB schema:
+        tables, other_tables = self.tables, other.tables
+        with self.connection() as conn:
+            for tname, sql in other.fetchall(
+                    "SELECT name, sql FROM sqlite_master WHERE type = 'table' ORDER BY rowid"):
+                if tname.startswith('sqlite_'):
+                    continue
+                if tname not in tables:
+                    conn.execute(sql)
+                    continue
+                for cname, type_ in other_tables[tname].items():
+                    if cname not in tables[tname]:
+                        conn.execute("ALTER TABLE {0} ADD COLUMN `{1}` {2}".format(
+                            tname, cname, type_))
+                    elif tables[tname][cname] != type_:
+                        raise ValueError(
+                            'column {0}:{1} {2} redefined with new type {3}'.format(
+                                tname, cname, tables[tname][cname], type_))
+            conn.commit()
+        self.update_schema()
+
+        # then copy the data in one transaction:
+        with self.connection() as conn:
+            conn.execute("ATTACH DATABASE ? AS other", (str(fname),))
+            for tname, cnames in other_tables.items():
+                if tname.startswith('sqlite_'):
+                    continue
+                cnames = ', '.join('`{0}`'.format(c) for c in cnames)
+                conn.execute("INSERT INTO main.{0} ({1}) SELECT {1} FROM other.{0}".format(
+                    tname, cnames))
+            conn.commit()
+            conn.execute("DETACH DATABASE other")
+        return dataset_ids
+
+    def load_datasets(self, datasets, workers=1):
+        """
+        Load lexibank datasets into the database.
+
+        With `workers > 1`, datasets are loaded into scratch databases in a pool of processes,
+        which are then merged into the database by the calling process. At most `2 * workers`
+        datasets are loaded ahead of the one being merged.
+
+        :param datasets: `list` of `pylexibank.dataset.Dataset` instances.
+        :param workers: Number of processes to use for loading datasets.
+        :return: generator of dataset IDs, yielded after a dataset has been written.
+        """
+        if workers > 1:
+            # Scratch databases are created next to the database, i.e. on the same file system.
+            with tempfile.TemporaryDirectory(
+                    prefix='clics-load-', dir=str(self.fname.parent)) as tmp, \
+                    ProcessPoolExecutor(max_workers=workers) as executor:
+                pending, datasets = deque(), iter(enumerate(datasets))
+                while True:
+                    for i, ds in datasets:
+                        # Datasets are re-instantiated in the worker processes.
+                        pending.append(executor.submit(
+                            _load_scratch, Path(tmp) / '{0}.sqlite'.format(i), type(ds)))
+                        if len(pending) >= 2 * workers:
+                            break
+                    if not pending:
+                        break
+                    fname = pending.popleft().result()
+                    dataset_ids = self.merge(fname)
+                    fname.unlink()
+                    for dataset_id in dataset_ids:
+                        yield dataset_id
+        else:
+            for ds in datasets:
+                self.load(ds)
+                yield ds.id
+
+    def update_row(self, table, keys, values):
+        if table == 'FormTable':
+            d = dict(zip(keys, values))
+            keys = list(keys) + ['`clics_form`']
+            values = list(values) + [clics_form(d['`Form`'])]
+        return keys, values
+
+    @property
+    def varieties(self):
+        return [Variety(*row) for row in self.fetchall('varieties')]
+
+    def _iter_rows(self, sql, params=None):
+        """
+        Stream the result rows of a query, rather than fetching them all at once.
+        """
+        with self.connection() as conn:
+            cu = conn.cursor()
+            cu.execute(self.sql.get(sql, sql), params or ())
+            for row in cu:
+                yield row
+
+    def iter_wordlists(self, varieties):
+        """
+        Iterate over the wordlists of the selected varieties.
+
+        All forms are read in one query, ordered by variety, so that only one wordlist at a
+        time needs to be kept in memory.
+
+        :param varieties: `Variety` instances to retrieve wordlists for.
+        :return: generator of pairs (`Variety`, `list` of `Form`), ordered by dataset ID and
+            language ID.
+        """
+        for v, rows in self._iter_wordlist_rows(varieties):
+            yield v, [Form(*row[2:]) for row in rows]
+
+    def iter_concept_forms(self, varieties):
+        """
+        Iterate over the wordlists of the selected varieties, in a lightweight representation.
+
+        :param varieties: `Variety` instances to retrieve wordlists for.
+        :return: generator of pairs (`Variety`, `list` of pairs (clics_form, concepticon_id)).
+        """
+        for v, rows in self._iter_wordlist_rows(varieties):
+            yield v, [(row[5], row[7]) for row in rows]
+
+    def _iter_wordlist_rows(self, varieties):
+        languages = {(v.source, v.id): v for v in varieties}
+        rows = self._iter_rows('wordlists')
+        for key, group in groupby(rows, lambda r: (r[0], r[1])):
+            v = languages.get(key)
+            if v is not None:
+                yield v, group
+
+    def update_colexifications(self, varieties):
+        """
+        Compute and store the colexifications for varieties of datasets which have changed since
+        the colexifications have last been computed.
+
+        Datasets are fingerprinted by their version and the number and maximal rowid of their
+        forms, so only the wordlists of new or changed datasets are read. The colexifications
+        are written per dataset, each in one short transaction, so that multiple processes can
+        update the colexifications of disjoint sets of varieties at the same time.
+
+        :param varieties: `Variety` instances to update colexifications for.
+        :return: `list` of the updated `Variety` instances.
+        """
+        if 'clics_colexification' not in self.tables:
+            self.update_schema()
+        fingerprints = dict(self.fetchall('dataset_fingerprints'))
+        stored = {(r[0], r[1]): r[2] for r in self.fetchall('select * from clics_wordlist')}
+        missing = object()
+        updated = [
+            v for v in varieties
+            if stored.get((v.source, v.id), missing) != fingerprints.get(v.source)]
+        by_dataset = OrderedDict()
+        for v in updated:
+            by_dataset.setdefault(v.source, []).append((v.source, v.id))
+        # We use one connection for reading and writing, to not lock ourselves out.
+        with self.connection() as conn:
+            for dataset_id, languages in by_dataset.items():
+                # The wordlists are read - and colexifications enumerated - before the write
+                # transaction is started:
+                rows = []
+                for key in languages:
+                    rows.extend(
+                        key + (
+                            i + 1, formA.clics_form,
+                            formA.id, formA.form, formA.concepticon_id,
+                            formB.id, formB.form, formB.concepticon_id)
+                        for i, (formA, formB) in enumerate(colexified_pairs(
+                            Form(*row) for row in conn.execute(
+                                self.sql['variety_wordlist'], key))))
+                conn.executemany(
+                    "DELETE FROM clics_colexification WHERE dataset_ID = ? AND Language_ID = ?",
+                    languages)
+                conn.executemany(
+                    "INSERT INTO clics_colexification (dataset_ID, Language_ID, ID, "
+                    "clics_form, Form_A_ID, Form_A, Concepticon_ID_A, "
+                    "Form_B_ID, Form_B, Concepticon_ID_B) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows)
+                conn.executemany(
+                    "INSERT OR REPLACE INTO clics_wordlist VALUES (?, ?, ?)",
+                    [key + (fingerprints.get(dataset_id),) for key in languages])
+                conn.commit()
+        return updated
+
+    def iter_colexifications(self, varieties):
+        """
+        Iterate over the stored colexifications of the selected varieties.
+
+        Note: `Database.update_colexifications` must be called before, to make sure stored
+        colexifications are up-to-date.
+
+        :param varieties: `Variety` instances to retrieve colexifications for.
+        :return: generator of pairs (`Variety`, `list` of pairs of `Form`), ordered by dataset
+            ID and language ID. The `Form` instances only provide the attributes required to
+            compute the colexification network, i.e. `id`, `source`, `form`, `clics_form` and
+            `concepticon_id`.
+        """
+        languages = {(v.source, v.id): v for v in varieties}
+        if not languages:
+            return
+        # We only read the range of rows spanned by the selected varieties.
+        rows = self._iter_rows("""\
 select
-    p.concepticon_id, group_concat(f.dataset_id || '-' || f.id, ' ')
+    dataset_id, language_id, clics_form,
+    form_a_id, form_a, concepticon_id_a, form_b_id, form_b, concepticon_id_b
 from
-    parametertable as p, formtable as f
+    clics_colexification
 where
-    f.parameter_id = p.id and f.dataset_id = p.dataset_id
-group by
-    p.concepticon_id
-""")}
+    (dataset_id, language_id) between (?, ?) and (?, ?)
+order by
+    dataset_id, language_id, id""", params=min(languages) + max(languages))
+        for key, group in groupby(rows, lambda r: (r[0], r[1])):
+            v = languages.get(key)
+            if v is not None:
+                yield v, [(
+                    Form(r[3], r[0], r[4], r[2], None, r[5], None, None, None),
+                    Form(r[6], r[0], r[7], r[2], None, r[8], None, None, None),
+                ) for r in group]
+
+    def _occurrences_by_concept(self):
+        """
+        Aggregate the varieties, families and forms for each concept in one ordered pass
+        over FormTable.
+
+        :return: `dict` mapping Concepticon IDs to triples of sorted lists (variety IDs,
+            families, form IDs).
+        """
+        res = {}
+        for cid, rows in groupby(self._iter_rows('concept_occurrences'), lambda r: r[0]):
+            lids, fids, wids = set(), set(), set()
+            for _, lid, family, wid in rows:
+                lids.add(lid)
+                if family is not None:
+                    fids.add(family)
+                wids.add(wid)
+            res[cid] = (sorted(lids), sorted(fids), sorted(wids))
+        return res
 
     def iter_concepts(self):
         concepts = [Concept(*row) for row in self.fetchall("""\
@@ -136,12 +573,103 @@ from
     parametertable
 where
     concepticon_id is not null""")]
-        lids = self._lids_by_concept()
-        fids = self._fids_by_concept()
-        wids = self._wids_by_concept()
+        occurrences = self._occurrences_by_concept()
 
         for c in concepts:
-            c.varieties = lids.get(c.id, [])
-            c.families = fids.get(c.id, [])
-            c.forms = wids.get(c.id, [])
+            c.varieties, c.families, c.forms = occurrences.get(c.id, ([], [], []))
             yield c
+
+
+class EvidenceStore(object):
+    """
+    The colexifications shared by pairs of languages in a language graph.
+
+    Rather than storing the shared colexifications with each edge of the graph, we store the
+    colexifications of each language - and the edges of the graph - in a SQLite database, and
+    compute the shared colexifications of two languages on demand.
+    """
+    schema = [
+        "CREATE TABLE language (id INTEGER PRIMARY KEY, gid TEXT UNIQUE)",
+        "CREATE TABLE colexification (id INTEGER PRIMARY KEY, concept_a TEXT, concept_b TEXT)",
+        """\
+CREATE TABLE language_colexification (
+    language_id INTEGER,
+    colexification_id INTEGER,
+    PRIMARY KEY (language_id, colexification_id)
+) WITHOUT ROWID""",
+        """\
+CREATE TABLE edge (
+    id INTEGER PRIMARY KEY,
+    language_a INTEGER,
+    language_b INTEGER,
+    weight INTEGER
+)""",
+        "CREATE UNIQUE INDEX edge_languages ON edge(language_a, language_b)",
+    ]
+
+    def __init__(self, fname):
+        self.fname = fname
+
+    def connection(self, readonly=True):
+        if readonly:
+            return closing(sqlite3.connect(
+                '{0}?mode=ro'.format(self.fname.resolve().as_uri()), uri=True))
+        return closing(sqlite3.connect(str(self.fname)))
+
+    def write(self, colexifications, edges):
+        """
+        :param colexifications: `pyclics.util.LanguageColexifications` instance.
+        :param edges: iterable of quadruples (edge ID, index of variety A, index of variety B,
+            weight).
+        """
+        if self.fname.exists():
+            self.fname.unlink()
+        incidence = colexifications.incidence.tocoo()
+        with self.connection(readonly=False) as conn:
+            for sql in self.schema:
+                conn.execute(sql)
+            conn.executemany(
+                "INSERT INTO language (id, gid) VALUES (?, ?)",
+                ((i, v.gid) for i, v in enumerate(colexifications.varieties)))
+            conn.executemany(
+                "INSERT INTO colexification (id, concept_a, concept_b) VALUES (?, ?, ?)",
+                ((i, a, b) for i, (a, b) in enumerate(colexifications.colexifications.values)))
+            conn.executemany(
+                "INSERT INTO language_colexification VALUES (?, ?)",
+                zip(incidence.row.tolist(), incidence.col.tolist()))
+            conn.executemany("INSERT INTO edge VALUES (?, ?, ?, ?)", edges)
+            conn.commit()
+        return self.fname
+
+    def shared(self, languageA, languageB):
+        """
+        :param languageA: ID of a language node, i.e. a `Variety.gid`.
+        :param languageB: ID of a language node.
+        :return: `list` of pairs of Concepticon IDs colexified in both languages.
+        """
+        with self.connection() as conn:
+            return [tuple(row) for row in conn.execute("""\
+SELECT c.concept_a, c.concept_b
+FROM
+    language AS la, language AS lb,
+    language_colexification AS a, language_colexification AS b,
+    colexification AS c
+WHERE
+    la.gid = ? AND lb.gid = ? AND
+    a.language_id = la.id AND b.language_id = lb.id AND
+    a.colexification_id = b.colexification_id AND c.id = a.colexification_id
+ORDER BY c.id""", (languageA, languageB))]
+
+    def edge(self, edge_id):
+        """
+        :param edge_id: The `evidence` attribute of an edge in the language graph.
+        :return: triple (language A, language B, `list` of shared colexifications).
+        """
+        with self.connection() as conn:
+            row = conn.execute("""\
+SELECT la.gid, lb.gid
+FROM edge AS e, language AS la, language AS lb
+WHERE e.id = ? AND la.id = e.language_a AND lb.id = e.language_b""", (edge_id,)).fetchone()
+        if row is None:
+            raise KeyError(edge_id)
+        return row[0], row[1], self.shared(*row)
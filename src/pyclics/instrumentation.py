@@ -0,0 +1,182 @@
+# coding: utf8
+"""
+Instrumentation of the stages of CLICS computations.
+
+For each stage, wall time, CPU time, peak memory usage and counts of processed items (rows,
+nodes, edges, ...) are recorded. Optionally, the stage is run with `cProfile`.
+
+Note: The peak memory usage of the process is only reset for each stage when profiling, because
+resetting it also discards the peak reported to the parent process, e.g. by `os.wait4`.
+"""
+import cProfile
+import json
+import re
+import sys
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+
+import attr
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+__all__ = ['Stage', 'Instrumentation']
+
+# On Linux, the peak resident set size of a process can be read and reset via procfs:
+PROC_STATUS = Path('/proc/self/status')
+PROC_CLEAR_REFS = Path('/proc/self/clear_refs')
+
+
+def peak_rss():
+    """
+    :return: The peak resident set size of the process in bytes - since the last call of
+        `reset_peak_rss` if it succeeded - or `None`.
+    """
+    if PROC_STATUS.exists():
+        with PROC_STATUS.open() as fp:
+            for line in fp:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    if resource:  # pragma: no cover
+        # ru_maxrss is given in bytes on macOS, in kilobytes elsewhere:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * \
+            (1 if sys.platform == 'darwin' else 1024)
+    return None  # pragma: no cover
+
+
+def reset_peak_rss():
+    """
+    :return: `bool` flag signaling whether the peak resident set size could be reset.
+    """
+    try:
+        with PROC_CLEAR_REFS.open('w') as fp:
+            fp.write('5')
+        return True
+    except OSError:  # pragma: no cover
+        return False
+
+
+@attr.s
+class Stage(object):
+    """
+    Resource usage of a stage of a computation.
+
+    :ivar level: Nesting level of the stage, i.e. the number of enclosing stages.
+    :ivar peak_rss_start: Peak resident set size of the process in bytes at the start of the
+        stage.
+    :ivar peak_rss: Peak resident set size in bytes during the stage, if the peak is reset for
+        each stage - otherwise of the process up to the end of the stage. In the latter case,
+        the stage only raised the peak if `peak_rss` exceeds `peak_rss_start`.
+    :ivar profile: Name of the file with the `cProfile` statistics of the stage.
+    """
+    name = attr.ib()
+    level = attr.ib(default=0)
+    counts = attr.ib(default=attr.Factory(OrderedDict))
+    wall_time = attr.ib(default=None)
+    cpu_time = attr.ib(default=None)
+    peak_rss_start = attr.ib(default=None)
+    peak_rss = attr.ib(default=None)
+    profile = attr.ib(default=None)
+
+    def count(self, **counts):
+        """
+        Record numbers of items processed in the stage, e.g. `stage.count(edges=100)`.
+        """
+        self.counts.update(sorted(counts.items()))
+
+    def as_dict(self):
+        return attr.asdict(self, dict_factory=OrderedDict)
+
+
+class Instrumentation(object):
+    """
+    Records the resource usage of (possibly nested) stages.
+
+    :param profile_dir: If not `None`, stages are run with `cProfile`, and the statistics
+        written to this directory - in the format read by `pstats.Stats`. Time spent in nested
+        stages is only included in the statistics of the innermost stage. Also, the peak memory
+        usage of the process is reset for each stage.
+    """
+    def __init__(self, profile_dir=None):
+        self.profile_dir = profile_dir
+        self.stages = []
+        # Stack of triples (stage, profiler, peak RSS) for the stages currently running:
+        self._running = []
+
+    def _update_peak(self):
+        rss = peak_rss()
+        if rss is not None:
+            for running in self._running:
+                running[2] = max(running[2] or 0, rss)
+
+    @contextmanager
+    def stage(self, name, **counts):
+        """
+        Context manager recording the resource usage of the code in its block.
+
+        :param name: Name of the stage, e.g. `infomap`.
+        :param counts: Counts of items, which can also be recorded within the block, calling
+            `Stage.count` on the context manager's target.
+        """
+        stage = Stage(name, level=len(self._running))
+        stage.count(**counts)
+        self.stages.append(stage)
+        number = len(self.stages)
+
+        # When profiling, the peak memory usage is reset for each stage - thus, we must record
+        # the peak reached in enclosing stages up to now:
+        self._update_peak()
+        stage.peak_rss_start = peak_rss()
+        profiler = None
+        if self.profile_dir:
+            reset_peak_rss()
+            if self._running and self._running[-1][1]:
+                self._running[-1][1].disable()
+            profiler = cProfile.Profile()
+        self._running.append([stage, profiler, None])
+
+        wall_time, cpu_time = time.perf_counter(), time.process_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield stage
+        finally:
+            if profiler:
+                profiler.disable()
+            stage.wall_time = round(time.perf_counter() - wall_time, 6)
+            stage.cpu_time = round(time.process_time() - cpu_time, 6)
+            self._update_peak()
+            stage.peak_rss = self._running.pop()[2]
+            if profiler:
+                p = Path(self.profile_dir) / '{0:02d}-{1}.prof'.format(
+                    number, re.sub('[^a-z0-9]+', '-', name.lower()).strip('-'))
+                profiler.dump_stats(str(p))
+                stage.profile = p.name
+                if self._running and self._running[-1][1]:
+                    self._running[-1][1].enable()
+
+    def add(self, stage):
+        """
+        Add a stage recorded elsewhere - e.g. in a worker process - nested in the stages
+        currently running.
+
+        :return: The `Stage` instance added.
+        """
+        stage.level += len(self._running)
+        self.stages.append(stage)
+        return stage
+
+    def as_dict(self):
+        return OrderedDict([('stages', [stage.as_dict() for stage in self.stages])])
+
+    def write(self, fname):
+        """
+        Write the recorded resource usage of all stages as JSON.
+        """
+        with Path(fname).open('w', encoding='utf8') as fp:
+            json.dump(self.as_dict(), fp, indent=2)
+        return fname
@@ -4,13 +4,18 @@ import html
 from pathlib import Path
 
 import attr
-import geojson
-import networkx as nx
 
-__all__ = ['Form', 'Concept', 'Variety', 'Network']
+from pyclics.util import save_binary_graph, load_binary_graph
 
+__all__ = ['Form', 'Concept', 'Variety', 'Network', 'GRAPH_FORMATS']
 
-@attr.s
+GRAPH_FORMATS = ('gml', 'bin')
+GML_BUFFER_SIZE = 1024 * 1024
+
+
+# The record types below are instantiated for every form (or variety) in the database when
+# computing networks, so we use slotted classes to keep the per-instance memory footprint small.
+@attr.s(slots=True)
 class WithGid(object):
     id = attr.ib()
     source = attr.ib()
@@ -20,7 +25,7 @@ class WithGid(object):
         return '{0}-{1}'.format(self.source, self.id)
 
 
-@attr.s
+@attr.s(slots=True)
 class Variety(WithGid):
     name = attr.ib()
     glottocode = attr.ib()
@@ -30,6 +35,8 @@ class Variety(WithGid):
     latitude = attr.ib()
 
     def as_geojson(self):
+        import geojson
+
         if self.latitude is None or self.longitude is None:
             kw = {}
         else:
@@ -52,11 +59,11 @@ class Variety(WithGid):
 
     def as_node_attrs(self):
         # Get dict of Variety attributes
-        out = vars(self)
+        out = attr.asdict(self)
         # Only keep attributes that aren't null (to avoid graphml problem)
         return {key:value for key,value in out.items() if value is not None}
 
-@attr.s
+@attr.s(slots=True)
 class Form(WithGid):
     form = attr.ib()
     clics_form = attr.ib()
@@ -67,7 +74,7 @@ class Form(WithGid):
     semantic_field = attr.ib()
 
 
-@attr.s
+@attr.s(slots=True)
 class Concept(object):
     id = attr.ib()
     gloss = attr.ib()
@@ -100,23 +107,66 @@ class Network(object):
     edgefilter = attr.ib()
     graphdir = attr.ib(convert=lambda s: Path(str(s)))
 
+    def path(self, fmt='gml'):
+        return self.graphdir / '{0.graphname}-{0.threshold}-{0.edgefilter}.{1}'.format(self, fmt)
+
     @property
     def fname(self):
-        return self.graphdir / '{0.graphname}-{0.threshold}-{0.edgefilter}.gml'.format(self)
-
-    def save(self, graph):
-        with self.fname.open('w') as fp:
-            fp.write('\n'.join(html.unescape(line) for line in nx.generate_gml(graph)))
+        return self.path('gml')
+
+    def save(self, graph, fmt='gml'):
+        """
+        Write the graph to a file.
+
+        :param fmt: `gml` or `bin` (see `pyclics.util.save_binary_graph`).
+        :return: `pathlib.Path` of the file written.
+        """
+        if fmt not in GRAPH_FORMATS:
+            raise ValueError('unknown graph format: {0}'.format(fmt))
+        if fmt == 'bin':
+            return save_binary_graph(graph, self.path(fmt))
+        import networkx as nx
+
+        # The GML lines are written one by one, rather than joined into one string first, to keep
+        # memory usage independent of the size of the graph:
+        with self.fname.open('w', buffering=GML_BUFFER_SIZE) as fp:
+            for i, line in enumerate(nx.generate_gml(graph)):
+                if i:
+                    fp.write('\n')
+                # Only lines with character references need to be unescaped:
+                fp.write(html.unescape(line) if '&' in line else line)
         return self.fname
 
-    @property
-    def graph(self):
+    def load(self, fmt=None):
+        """
+        Read the graph from a file.
+
+        :param fmt: `gml` or `bin` - if `None`, the binary file is read if it is at least as
+            recent as the GML file.
+        """
+        if fmt is None:
+            binary = self.path('bin')
+            fmt = 'bin' if binary.exists() and (
+                not self.fname.exists() or
+                binary.stat().st_mtime >= self.fname.stat().st_mtime) else 'gml'
+        if fmt not in GRAPH_FORMATS:
+            raise ValueError('unknown graph format: {0}'.format(fmt))
+        if fmt == 'bin':
+            return load_binary_graph(self.path(fmt))
+        import networkx as nx
+
         def lines():
             for line in self.fname.open():
                 yield line.encode('ascii', 'xmlcharrefreplace').decode('utf-8')
         return nx.parse_gml(''.join(lines()))
 
+    @property
+    def graph(self):
+        return self.load()
+
     def components(self, graph=None):
+        import networkx as nx
+
         return sorted(nx.connected_components(graph or self.graph))
 
     def communities(self, graph=None):
@@ -0,0 +1,195 @@
+# coding: utf8
+"""
+A local HTTP server for the CLICS app, which computes the data for clusters and subgraphs on
+demand - rather than reading the files exported by `clics communities` and `clics subgraph`.
+"""
+import asyncio
+import hashlib
+import json
+import mimetypes
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import unquote, urlparse
+
+from pyclics.util import (
+    Adjacency, OutEdges, cluster_payload, subgraph_names, subgraph_payload,
+)
+
+__all__ = ['AppServer']
+
+APP_DIR = Path(__file__).parent / 'app'
+STATUS = {
+    200: 'OK',
+    304: 'Not Modified',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    500: 'Internal Server Error',
+}
+
+
+def _js_var(name, value):
+    return ('var ' + name + ' = ' + json.dumps(value, indent=2) + ';').encode('utf8')
+
+
+class AppServer(object):
+    """
+    Serves
+    - `/cluster/<ClusterName>.json` computed from the infomap graph,
+    - `/subgraph/<ClusterName>.json` computed from the graph `graphname`,
+    - `/source/infomap-names.js` and `/source/subgraph-names.js`,
+    - the files in the `app` directory of the CLICS repository, falling back to the assets
+      of the CLICS app shipped with `pyclics`.
+
+    Files exported to `app/cluster` and `app/subgraph` are never served, since they may be
+    stale, i.e. computed for another threshold or edge filter.
+
+    Computed data is cached, and responses carry an `ETag` header.
+    """
+    def __init__(
+            self, api, threshold, edgefilter, graphname='network', neighbor_weight=5,
+            cache_size=256):
+        self.api = api
+
+        # The clusters are read from the infomap graph, as written by `clics communities`:
+        self.infomap = api.load_graph('infomap', threshold, edgefilter)
+        self.clusters = OrderedDict()
+        for node, data in self.infomap.nodes(data=True):
+            self.clusters.setdefault(data['ClusterName'], []).append(node)
+        self.infomap_out_edges = OutEdges(self.infomap, neighbor_weight)
+
+        # The subgraphs are computed as in `clics subgraph`:
+        self.graph = api.load_graph(graphname, threshold, edgefilter)
+        neighbourhoods = Adjacency(self.graph).neighbourhoods(
+            max_size=30, max_generation=50, generations=3)
+        self.subgraphs = OrderedDict()
+        for (node, data), nodes, name in zip(
+                self.graph.nodes(data=True),
+                neighbourhoods,
+                subgraph_names(self.graph, neighbourhoods)):
+            data['subgraph'] = list(nodes)
+            data['ClusterName'] = name
+            if len(nodes) > 1:
+                self.subgraphs[name] = (node, nodes)
+        self.out_edges = OutEdges(self.graph, neighbor_weight)
+
+        self.content = lru_cache(maxsize=cache_size)(self._content)
+
+    def _content(self, path):
+        """
+        :return: pair (content type, content as `bytes`) or `None`.
+        """
+        comps = path.strip('/').split('/')
+        if len(comps) == 2 and comps[1].endswith('.json'):
+            name = comps[1][:-len('.json')]
+            if comps[0] == 'cluster' and name in self.clusters:
+                return 'application/json', self._json(
+                    cluster_payload(self.infomap, self.clusters[name], self.infomap_out_edges))
+            if comps[0] == 'subgraph' and name in self.subgraphs:
+                return 'application/json', self._json(
+                    subgraph_payload(self.graph, *self.subgraphs[name], self.out_edges))
+        if comps == ['source', 'infomap-names.js']:
+            return 'application/javascript', _js_var('INFO', {
+                self.infomap.node[node]['Gloss']: name
+                for name, nodes in self.clusters.items() for node in nodes})
+        if comps == ['source', 'subgraph-names.js']:
+            return 'application/javascript', _js_var('SUBG', {
+                self.graph.node[node]['Gloss']: name
+                for name, (node, _) in self.subgraphs.items()})
+        return None
+
+    @staticmethod
+    def _json(payload):
+        # Serialized as in the files exported by `clics communities` and `clics subgraph`:
+        return json.dumps(payload, sort_keys=True).encode('utf8')
+
+    def static(self, path):
+        """
+        :return: `Path` of a static file of the app or `None`.
+        """
+        comps = [c for c in path.strip('/').split('/') if c] or ['index.html']
+        if any(c in ['.', '..'] for c in comps) or comps[0] in ['cluster', 'subgraph']:
+            return None
+        candidates = [self.api.path('app', *comps)]
+        if comps[0] == 'source' and len(comps) == 2:
+            candidates.append(APP_DIR / comps[1])
+        elif len(comps) == 1 and comps[0].endswith('.html'):
+            candidates.append(APP_DIR / comps[0])
+        for p in candidates:
+            if p.is_file():
+                return p
+        return None
+
+    def response(self, method, target, headers):
+        """
+        :param method: HTTP method.
+        :param target: Request target, i.e. path and query.
+        :param headers: `dict` of request headers, with lowercase names.
+        :return: triple (status code, `OrderedDict` of response headers, body as `bytes`).
+        """
+        if method not in ['GET', 'HEAD']:
+            return 405, OrderedDict([('Allow', 'GET, HEAD')]), b''
+        path = unquote(urlparse(target).path)
+        content = self.content(path)
+        if content is None:
+            p = self.static(path)
+            if p is None:
+                return 404, OrderedDict(), b''
+            content = (mimetypes.guess_type(p.name)[0] or 'application/octet-stream',
+                       p.read_bytes())
+        content_type, body = content
+        etag = '"{0}"'.format(hashlib.md5(body).hexdigest())
+        res_headers = OrderedDict([('ETag', etag), ('Cache-Control', 'no-cache')])
+        if headers.get('if-none-match') == etag:
+            return 304, res_headers, b''
+        res_headers['Content-Type'] = content_type
+        res_headers['Content-Length'] = str(len(body))
+        return 200, res_headers, body if method == 'GET' else b''
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin1')
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in [b'\r\n', b'\n', b'']:
+                    break
+                name, _, value = line.decode('latin1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            try:
+                method, target, _ = request_line.split(' ', 2)
+                status, res_headers, body = self.response(method, target, headers)
+            except Exception:  # pragma: no cover
+                status, res_headers, body = 500, OrderedDict(), b''
+            res_headers['Connection'] = 'close'
+            lines = ['HTTP/1.1 {0} {1}'.format(status, STATUS[status])]
+            lines.extend('{0}: {1}'.format(k, v) for k, v in res_headers.items())
+            writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin1') + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    def start(self, host='127.0.0.1', port=8000):
+        """
+        :return: coroutine creating an `asyncio.Server`.
+        """
+        return asyncio.start_server(self.handle, host, port)
+
+    def serve_forever(self, host='127.0.0.1', port=8000):
+        """
+        Serve requests on a new event loop, until interrupted.
+        """
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            server = loop.run_until_complete(self.start(host, port))
+            try:
+                loop.run_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                server.close()
+                loop.run_until_complete(server.wait_closed())
+        finally:
+            asyncio.set_event_loop(None)
+            loop.close()
@@ -1,25 +1,74 @@
 # coding: utf8
-from collections import defaultdict
+from array import array
+from collections import defaultdict, OrderedDict
+from itertools import chain, combinations
+import hashlib
+import json
+import struct
+import sys
 
-import igraph
+# Note: networkx and igraph are imported within the functions using them, because this module
+# is also used by commands which do not deal with graphs.
 
-__all__ = ['full_colexification', 'networkx2igraph']
+__all__ = [
+    'full_colexification', 'colexified_pairs', 'networkx2igraph',
+    'Colexifications', 'chunked',
+    'colexification_weights', 'save_binary_graph', 'load_binary_graph',
+    'LanguageColexifications', 'OutEdges', 'Adjacency', 'cluster_payload', 'subgraph_names',
+    'subgraph_payload']
+
+
+def _attribute_columns(records, exclude=()):
+    """
+    Transpose attribute dicts into columns, using `None` for missing values.
+    """
+    records = list(records)
+    names = OrderedDict()
+    for data in records:
+        names.update((k, None) for k in data if k not in exclude)
+    return [(name, [data.get(name) for data in records]) for name in names]
 
 
 def networkx2igraph(graph):
-    """Helper function converts networkx graph to igraph graph object."""
-    newgraph = igraph.Graph(directed=graph.is_directed())
-    nodes = {}
-    for i, (node, data) in enumerate(graph.nodes(data=True)):
-        data = {a: b for a, b in data.items()}
-        newgraph.add_vertex(
-            i, Name=node, **{a: b for a, b in data.items() if a not in ['Name', 'name']})
-        nodes[node] = i
-    for node1, node2, data in graph.edges(data=True):
-        newgraph.add_edge(nodes[node1], nodes[node2], **{a: b for a, b in data.items()})
+    """
+    Helper function converts networkx graph to igraph graph object.
+
+    The graph is built in one call from the list of edges between node indices, and the
+    attributes are set per column. The `name` attribute of a vertex is its index, the `Name`
+    attribute the networkx node ID.
+    """
+    import igraph
+
+    nodes = list(graph.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    newgraph = igraph.Graph(
+        n=len(nodes),
+        edges=[(index[node1], index[node2]) for node1, node2 in graph.edges()],
+        directed=graph.is_directed())
+    newgraph.vs['name'] = list(range(len(nodes)))
+    newgraph.vs['Name'] = nodes
+    for name, values in _attribute_columns(
+            (data for _, data in graph.nodes(data=True)), exclude=('Name', 'name')):
+        newgraph.vs[name] = values
+    for name, values in _attribute_columns(data for _, _, data in graph.edges(data=True)):
+        newgraph.es[name] = values
     return newgraph
 
 
+def chunked(items, n):
+    """
+    Split a list into at most `n` consecutive chunks of (roughly) equal size.
+    """
+    size, rest = divmod(len(items), n)
+    chunks, start = [], 0
+    for i in range(n):
+        end = start + size + (1 if i < rest else 0)
+        if end > start:
+            chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
 def full_colexification(forms):
     """
     Calculate all colexifications inside a wordlist.
@@ -45,6 +94,585 @@ def full_colexification(forms):
             cols[form.clics_form].append(form)
     return cols
 
+
+def colexified_pairs(forms):
+    """
+    Enumerate the pairs of forms in a wordlist which colexify two different concepts.
+
+    :param forms: The forms of a wordlist.
+    :return: generator of pairs of `Form` instances.
+    """
+    for _, v in full_colexification(forms).items():
+        for formA, formB in combinations(v, r=2):
+            # If the two words are not just synonyms/word variants...
+            if formA.concepticon_id != formB.concepticon_id:
+                yield formA, formB
+
+
+class Interned(object):
+    """
+    A mapping of hashable values to dense integer IDs, assigned in order of first occurrence.
+    """
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, i):
+        return self.values[i]
+
+    def __call__(self, value):
+        i = self.ids.get(value)
+        if i is None:
+            i = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return i
+
+    def extend(self, values):
+        """
+        Intern a sequence of distinct values, none of which has been interned before.
+
+        :return: `bool` flag signaling whether the values have been interned - with consecutive
+            IDs, starting at the length of the mapping before the call.
+        """
+        if not self.ids.keys().isdisjoint(values):
+            return False
+        self.ids.update(zip(values, range(len(self.values), len(self.values) + len(values))))
+        self.values.extend(values)
+        return True
+
+
+# Pairs of form IDs are stored as one integer:
+_SHIFT = 32
+_MASK = (1 << _SHIFT) - 1
+
+
+class Colexifications(object):
+    """
+    Aggregated evidence for the edges of a colexification network.
+
+    For each pair of concepts, we collect the colexifying word pairs, the languages and
+    families in which the colexification is attested and a list of evidence tuples. Concepts,
+    varieties, families and forms are interned as integers, and evidence is accumulated in
+    compact structures; strings are only created when the attributes of an edge are exported.
+
+    Since insertion order is preserved, aggregates computed for consecutive chunks of
+    varieties can be merged - in order - into the same aggregate as computed for all
+    varieties at once.
+    """
+    def __init__(self):
+        self.concepts = Interned()
+        self.families = Interned()
+        # Varieties are interned by gid; we also keep the ID of their family.
+        self.varieties = Interned()
+        self.variety_families = array('l')
+        # Forms are interned by gid; we also keep pairs (clics_form, form).
+        self.forms = Interned()
+        self.form_data = []
+        # Maps pairs of concept IDs to lists [words, languages, families, pairs, pair_varieties],
+        # where
+        # - words is a set of integers encoding pairs of form IDs,
+        # - languages is an array of variety IDs,
+        # - families is a bitset of family IDs, stored as int,
+        # - pairs is an array of the integers encoding the pairs of form IDs, in order of
+        #   addition, and pair_varieties the array of the corresponding variety IDs.
+        self.edges = OrderedDict()
+        # Maps pairs of concept IDs to edge IDs, i.e. to their index in `edges`:
+        self._edge_ids = None
+
+    def __len__(self):
+        return len(self.edges)
+
+    def _variety(self, gid, family):
+        vid = self.varieties(gid)
+        if vid == len(self.variety_families):
+            self.variety_families.append(self.families(family))
+        return vid
+
+    def _form(self, gid, clics_form, form):
+        fid = self.forms(gid)
+        if fid == len(self.form_data):
+            self.form_data.append((clics_form, form))
+        return fid
+
+    def _edge(self, conceptA, conceptB):
+        for key in [(conceptA, conceptB), (conceptB, conceptA)]:
+            if key in self.edges:
+                return self.edges[key]
+        self.edges[conceptA, conceptB] = [set(), array('l'), 0, array('q'), array('l')]
+        return self.edges[conceptA, conceptB]
+
+    def add(self, variety, pairs):
+        """
+        Add the colexifications of one variety.
+
+        :param variety: `Variety` instance.
+        :param pairs: iterable of pairs of `Form` instances, colexifying different concepts.
+        """
+        vid = self._variety(variety.gid, variety.family)
+        family = 1 << self.variety_families[vid]
+        for formA, formB in pairs:
+            a = self._form(formA.gid, formA.clics_form, formA.form)
+            b = self._form(formB.gid, formB.clics_form, formB.form)
+            edge = self._edge(
+                self.concepts(formA.concepticon_id), self.concepts(formB.concepticon_id))
+            pair = (a << _SHIFT) | b
+            edge[0].add(pair)
+            if not edge[1] or edge[1][-1] != vid:
+                edge[1].append(vid)
+            edge[2] |= family
+            edge[3].append(pair)
+            edge[4].append(vid)
+
+    def compact(self):
+        """
+        :return: `dict` representing the aggregate with a few flat arrays and lists of strings
+            rather than lots of small objects - e.g. to be sent from a worker process, and merged
+            via `Colexifications.update`. Since `words` is the set of `pairs`, it is not
+            included.
+        """
+        edges = list(self.edges.values())
+        return {
+            'concepts': self.concepts.values,
+            'families': self.families.values,
+            'varieties': self.varieties.values,
+            'variety_families': self.variety_families,
+            'forms': self.forms.values,
+            'form_data': list(chain.from_iterable(self.form_data)),
+            'edges': array('l', chain.from_iterable(self.edges)),
+            'edge_families': [edge[2] for edge in edges],
+            'edge_languages': array('l', (len(edge[1]) for edge in edges)),
+            'languages': array('l', chain.from_iterable(edge[1] for edge in edges)),
+            'edge_pairs': array('l', (len(edge[3]) for edge in edges)),
+            'pairs': array('q', chain.from_iterable(edge[3] for edge in edges)),
+            'pair_varieties': array('l', chain.from_iterable(edge[4] for edge in edges)),
+        }
+
+    def update(self, other):
+        """
+        Merge the aggregate computed for a subsequent chunk of varieties.
+
+        IDs of the other aggregate are translated via lookup tables, computed once. Since the
+        forms of different varieties are distinct, they typically are interned with consecutive
+        IDs, and pairs of form IDs can be translated by adding an offset.
+
+        :param other: `Colexifications` instance or its compact representation (see
+            `Colexifications.compact`).
+        """
+        if isinstance(other, Colexifications):
+            other = other.compact()
+        concepts = [self.concepts(c) for c in other['concepts']]
+        families = [self.families(f) for f in other['families']]
+        varieties = [
+            self._variety(gid, other['families'][fid])
+            for gid, fid in zip(other['varieties'], other['variety_families'])]
+        form_data = zip(other['form_data'][::2], other['form_data'][1::2])
+        offset = len(self.forms)
+        if self.forms.extend(other['forms']):
+            self.form_data.extend(form_data)
+            pair = (offset * ((1 << _SHIFT) + 1)).__add__ if offset else None
+        else:
+            forms = [self._form(gid, *data) for gid, data in zip(other['forms'], form_data)]
+
+            def pair(w):
+                return (forms[w >> _SHIFT] << _SHIFT) | forms[w & _MASK]
+
+        # When merging into an empty aggregate, IDs are typically not changed at all:
+        variety = None if varieties == list(range(len(varieties))) else varieties.__getitem__
+        fambits = {}
+        keys, languages, pairs, vids = \
+            other['edges'], other['languages'], other['pairs'], other['pair_varieties']
+        start, lstart = 0, 0
+        for i, (bits, nlanguages, npairs) in enumerate(
+                zip(other['edge_families'], other['edge_languages'], other['edge_pairs'])):
+            if bits not in fambits:
+                # Only the bits which are set are visited:
+                fambits[bits], b = 0, bits
+                while b:
+                    low = b & -b
+                    fambits[bits] |= 1 << families[low.bit_length() - 1]
+                    b ^= low
+            conceptA, conceptB = concepts[keys[2 * i]], concepts[keys[2 * i + 1]]
+            pairs_ = pairs[start:start + npairs]
+            if pair:
+                pairs_ = array('q', map(pair, pairs_))
+            languages_, vids_ = languages[lstart:lstart + nlanguages], vids[start:start + npairs]
+            if variety:
+                languages_ = array('l', map(variety, languages_))
+                vids_ = array('l', map(variety, vids_))
+            start += npairs
+            lstart += nlanguages
+
+            edge = self.edges.get((conceptA, conceptB)) or self.edges.get((conceptB, conceptA))
+            if edge is None:
+                self.edges[conceptA, conceptB] = [
+                    set(pairs_), languages_, fambits[bits], pairs_, vids_]
+            else:
+                edge[0].update(pairs_)
+                edge[1].extend(languages_)
+                edge[2] |= fambits[bits]
+                edge[3].extend(pairs_)
+                edge[4].extend(vids_)
+
+    def weights(self):
+        """
+        :return: `OrderedDict` mapping pairs of Concepticon IDs to triples (number of
+            families, number of languages, number of word pairs).
+        """
+        return OrderedDict(
+            (
+                (self.concepts[conceptA], self.concepts[conceptB]),
+                (bin(families).count('1'), len(languages), len(words)))
+            for (conceptA, conceptB), (words, languages, families, _, _) in self.edges.items())
+
+    def digest(self):
+        """
+        :return: Hex digest of the edges - in order - and their weights, identifying the edge IDs
+            of the aggregate.
+        """
+        return hashlib.md5(json.dumps(list(self.weights().items())).encode('utf8')).hexdigest()
+
+    def _edge_id(self, conceptA, conceptB):
+        if self._edge_ids is None or len(self._edge_ids) != len(self.edges):
+            self._edge_ids = {key: i for i, key in enumerate(self.edges)}
+        return self._edge_ids.get((conceptA, conceptB), self._edge_ids.get((conceptB, conceptA)))
+
+    def evidence(self):
+        """
+        The evidence for all edges, i.e. lists of the colexifying word pairs. Each word pair is
+        described by a list
+        [form A gid, form B gid, clics_form, variety gid, family, form A, form B].
+
+        :return: generator of lists of word pairs, ordered by edge ID.
+        """
+        for _, _, _, pairs, varieties in self.edges.values():
+            yield [[
+                self.forms[pair >> _SHIFT],
+                self.forms[pair & _MASK],
+                self.form_data[pair >> _SHIFT][0],
+                self.varieties[vid],
+                self.families[self.variety_families[vid]],
+                self.form_data[pair >> _SHIFT][1],
+                self.form_data[pair & _MASK][1]] for pair, vid in zip(pairs, varieties)]
+
+    def edge_attrs(self, conceptA, conceptB):
+        """
+        :return: `OrderedDict` of the attributes of an edge of the colexification network. The
+            evidence for the edge - i.e. the colexifying words with their languages and
+            families - is only referenced by edge ID (see `Colexifications.evidence`).
+        """
+        cidA, cidB = self.concepts.ids[conceptA], self.concepts.ids[conceptB]
+        words, languages, families, _, _ = self._edge(cidA, cidB)
+        return OrderedDict([
+            ('evidence', self._edge_id(cidA, cidB)),
+            ('WordWeight', len(words)),
+            ('FamilyWeight', bin(families).count('1')),
+            ('LanguageWeight', len(languages)),
+        ])
+
+
+def colexification_weights(wordlists):
+    """
+    Compute the weights of the edges of a colexification network using sparse matrices.
+
+    Forms with the same `clics_form` in a variety make up a group. From the group x concept
+    incidence matrix `M` (counting forms), we get
+    - the number of colexifying word pairs for two concepts from `M^T M`,
+    - the number of languages (or families) from `S^T bin(R R^T) S`, where `R` is the
+      incidence matrix of (variety, concept) - or (family, concept) - pairs and groups, and
+      `S` maps these pairs to concepts.
+
+    :param wordlists: iterable of pairs (`Variety`, iterable of (clics_form, concepticon_id)).
+    :return: `OrderedDict` mapping pairs of Concepticon IDs to triples (number of families,
+        number of languages, number of word pairs).
+    """
+    import numpy
+    from scipy import sparse
+
+    concepts, family_ids = Interned(), Interned()
+    group_variety, group_family, rows, cols = array('l'), array('l'), array('l'), array('l')
+    for vid, (variety, forms) in enumerate(wordlists):
+        fid = family_ids(variety.family)
+        groups = {}
+        for clics_form, concepticon_id in forms:
+            if clics_form and concepticon_id:
+                if clics_form not in groups:
+                    groups[clics_form] = len(group_variety)
+                    group_variety.append(vid)
+                    group_family.append(fid)
+                rows.append(groups[clics_form])
+                cols.append(concepts(concepticon_id))
+
+    shape = (len(group_variety), len(concepts))
+    rows, cols = numpy.array(rows, dtype=int), numpy.array(cols, dtype=int)
+    # Duplicate entries are summed up, i.e. M counts the forms per group and concept:
+    M = sparse.csr_matrix((numpy.ones(len(rows), dtype=int), (rows, cols)), shape=shape)
+    words = sparse.triu(M.T.dot(M), k=1).tocoo()
+
+    def distinct(owners):
+        # Count the distinct owners - i.e. varieties or families - in which concepts share a
+        # group.
+        B = M.tocoo()
+        keys = numpy.array(owners, dtype=int)[B.row] * shape[1] + B.col
+        keys, index = numpy.unique(keys, return_inverse=True)
+        R = sparse.csr_matrix(
+            (numpy.ones(len(index), dtype=int), (index, B.row)), shape=(len(keys), shape[0]))
+        X = R.dot(R.T)
+        X.data[:] = 1
+        S = sparse.csr_matrix(
+            (numpy.ones(len(keys), dtype=int), (numpy.arange(len(keys)), keys % shape[1])),
+            shape=(len(keys), shape[1]))
+        return sparse.triu(S.T.dot(X).dot(S), k=1).tocsr()
+
+    order = numpy.lexsort((words.col, words.row))
+    rows, cols, counts = words.row[order], words.col[order], words.data[order]
+    languages = numpy.asarray(distinct(group_variety)[rows, cols]).ravel()
+    families = numpy.asarray(distinct(group_family)[rows, cols]).ravel()
+    return OrderedDict(
+        ((concepts[i], concepts[j]), (int(fc), int(lc), int(wc)))
+        for i, j, fc, lc, wc in zip(rows, cols, families, languages, counts))
+
+
+class LanguageColexifications(object):
+    """
+    The colexifications attested in a list of varieties, stored as sparse incidence matrix of
+    varieties and colexified pairs of concepts.
+    """
+    def __init__(self, wordlists):
+        """
+        :param wordlists: iterable of pairs (`Variety`, iterable of (clics_form, concepticon_id)).
+        """
+        import numpy
+        from scipy import sparse
+
+        self.varieties, self.colexifications = [], Interned()
+        rows, cols = array('l'), array('l')
+        for vid, (variety, forms) in enumerate(wordlists):
+            self.varieties.append(variety)
+            concepts = defaultdict(set)
+            for clics_form, concepticon_id in forms:
+                if clics_form and concepticon_id:
+                    concepts[clics_form].add(concepticon_id)
+            colexified = set()
+            for cids in concepts.values():
+                colexified.update(combinations(sorted(cids), 2))
+            for pair in sorted(colexified):
+                rows.append(vid)
+                cols.append(self.colexifications(pair))
+        self.incidence = sparse.csr_matrix(
+            (numpy.ones(len(rows), dtype=int), (rows, cols)),
+            shape=(len(self.varieties), len(self.colexifications)))
+
+    def weights(self, threshold=1):
+        """
+        Compute the number of colexifications shared by pairs of varieties.
+
+        :param threshold: Minimal number of shared colexifications.
+        :return: `list` of triples (index of variety A, index of variety B, number of shared
+            colexifications).
+        """
+        import numpy
+        from scipy import sparse
+
+        shared = sparse.triu(self.incidence.dot(self.incidence.T), k=1).tocoo()
+        keep = shared.data >= threshold
+        rows, cols, counts = shared.row[keep], shared.col[keep], shared.data[keep]
+        order = numpy.lexsort((cols, rows))
+        return [
+            (int(i), int(j), int(count))
+            for i, j, count in zip(rows[order], cols[order], counts[order])]
+
+    def _row(self, i):
+        return self.incidence.indices[self.incidence.indptr[i]:self.incidence.indptr[i + 1]]
+
+    def shared(self, i, j):
+        """
+        :return: `list` of the colexified pairs of concepts shared by two varieties.
+        """
+        import numpy
+
+        return [
+            self.colexifications[k] for k in numpy.intersect1d(self._row(i), self._row(j))]
+
+    def languages(self):
+        """
+        :return: `OrderedDict` mapping colexified pairs of concepts to the list of `Variety`
+            objects in which they are attested.
+        """
+        by_colexification = self.incidence.tocsc()
+        return OrderedDict(
+            (pair, [
+                self.varieties[i] for i in
+                by_colexification.indices[
+                    by_colexification.indptr[k]:by_colexification.indptr[k + 1]]])
+            for k, pair in enumerate(self.colexifications.values))
+
+
+class Adjacency(object):
+    """
+    A compact representation of the adjacency of a graph in CSR format, i.e. the neighbours of
+    the node with index `i` are the node indices `indices[indptr[i]:indptr[i + 1]]`.
+    """
+    def __init__(self, graph):
+        """
+        :param graph: `networkx.Graph` instance.
+        """
+        self.nodes = list(graph)
+        index = {node: i for i, node in enumerate(self.nodes)}
+        self.indptr, self.indices = array('l', [0]), array('l')
+        for node in self.nodes:
+            self.indices.extend(index[n] for n in graph[node])
+            self.indptr.append(len(self.indices))
+
+    def neighbors(self, i):
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def neighbourhoods(self, max_size=30, max_generation=50, generations=3):
+        """
+        Compute bounded neighbourhoods of all nodes.
+
+        Starting with the node itself, the neighbours of the last generation of nodes are added
+        as next generation, as long as
+        - the neighbourhood has less than `max_size` nodes,
+        - there are less than `generations` generations,
+        - the next generation does not have more than `max_generation` nodes.
+
+        :return: `list` of tuples of nodes - in graph order - with identical neighbourhoods
+            represented by the same tuple.
+        """
+        cache, res = {}, []
+        for i in range(len(self.nodes)):
+            members = {i}
+            lastgen, ngenerations = members, 1
+            while lastgen and len(members) < max_size and ngenerations < generations:
+                nextgen = set()
+                for j in lastgen:
+                    nextgen.update(self.neighbors(j))
+                if len(nextgen) > max_generation:
+                    break
+                members = members | nextgen
+                lastgen, ngenerations = nextgen, ngenerations + 1
+            key = frozenset(members)
+            if key not in cache:
+                cache[key] = tuple(self.nodes[j] for j in sorted(members))
+            res.append(cache[key])
+        return res
+
+
+class OutEdges(object):
+    """
+    Look up the neighbours of a node outside of a cluster of nodes, i.e. the targets of the
+    `OutEdge`s exported for the CLICS app.
+
+    Only the adjacency of the node is inspected, and neighbours are returned in the order of
+    the nodes in the graph.
+    """
+    def __init__(self, graph, cutoff, weight='FamilyWeight'):
+        """
+        :param graph: `networkx.Graph` instance.
+        :param cutoff: Minimal weight of edges to neighbours.
+        :param weight: Name of the edge attribute holding the weight.
+        """
+        self.graph = graph
+        self.cutoff = cutoff
+        self.weight = weight
+        self.position = {node: i for i, node in enumerate(graph)}
+
+    def neighbors(self, node, cluster):
+        """
+        :param node: A node in the graph.
+        :param cluster: Container of nodes - including `node` - to be excluded.
+        :return: `list` of neighbour nodes.
+        """
+        return sorted(
+            (n for n, data in self.graph[node].items()
+             if data[self.weight] >= self.cutoff and n not in cluster),
+            key=self.position.__getitem__)
+
+
+def cluster_payload(graph, nodes, out_edges):
+    """
+    Compute the data for a cluster of nodes, as exported for the CLICS app.
+
+    Note: The `OutEdge` attribute of the nodes in the cluster is (re-)set.
+
+    :param graph: `networkx.Graph` with `ClusterName` and `CentralConcept` node attributes.
+    :param nodes: The nodes of the cluster.
+    :param out_edges: `OutEdges` instance for `graph`.
+    :return: The subgraph of the cluster in adjacency data format.
+    """
+    from networkx.readwrite import json_graph
+
+    sg = graph.subgraph(nodes)
+    for node, data in sg.nodes(data=True):
+        data['OutEdge'] = []
+        neighbors = out_edges.neighbors(node, sg)
+        if neighbors:
+            sg.node[node]['OutEdge'] = []
+            for n in neighbors:
+                sg.node[node]['OutEdge'].append([
+                    graph.node[n]['ClusterName'],
+                    graph.node[n]['CentralConcept'],
+                    graph.node[n]['Gloss'],
+                    graph[node][n]['WordWeight'],
+                    n
+                ])
+    return json_graph.adjacency_data(sg)
+
+
+def subgraph_names(graph, neighbourhoods):
+    """
+    Name the subgraphs formed by the neighbourhoods of the nodes of a graph as
+    `subgraph_<N>_<Gloss>`, numbering the subgraphs by descending size, and using the gloss of
+    the node with the highest degree.
+
+    :param neighbourhoods: `list` of tuples of nodes, as computed by `Adjacency.neighbourhoods`.
+    :return: `list` of subgraph names, for the nodes in graph order.
+    """
+    names, nodes2name = [None] * len(neighbourhoods), {}
+    for i in sorted(
+            range(len(neighbourhoods)), key=lambda i: len(neighbourhoods[i]), reverse=True):
+        nodes = neighbourhoods[i]
+        if nodes not in nodes2name:
+            sg = graph.subgraph(nodes)
+            nodes2name[nodes] = 'subgraph_{0}_{1}'.format(
+                len(nodes2name) + 1, graph.node[max(nodes, key=sg.degree)]['Gloss'])
+        names[i] = nodes2name[nodes]
+    return names
+
+
+def subgraph_payload(graph, node, nodes, out_edges):
+    """
+    Compute the data for the subgraph formed by the neighbourhood of a node, as exported for
+    the CLICS app.
+
+    Note: The `OutEdge` attribute of the nodes in the subgraph is (re-)set.
+
+    :param node: The node.
+    :param nodes: The neighbourhood of the node.
+    :param out_edges: `OutEdges` instance for `graph`.
+    :return: The subgraph in adjacency data format.
+    """
+    from networkx.readwrite import json_graph
+
+    sg = graph.subgraph(nodes)
+    for _, data in sg.nodes(data=True):
+        data['OutEdge'] = []
+    # Only the node itself links to the concepts it is strongly connected to outside of the
+    # subgraph:
+    sg.node[node]['OutEdge'] = [
+        [
+            'subgraph_' + n + '_' + graph.node[n]['Gloss'],
+            graph.node[n]['Gloss'],
+            graph.node[n]['Gloss'],
+            graph[node][n]['FamilyWeight'],
+            n
+        ] for n in out_edges.neighbors(node, sg)]
+    return json_graph.adjacency_data(sg)
+
+
 def get_denoted_concepts(forms):
     """
     Similar to above, but instead of returning a list of colexified Form
@@ -61,4 +689,172 @@ def get_denoted_concepts(forms):
     for form in forms:
         if form.clics_form and form.concepticon_id:
             cons[form.clics_form].add(form.concepticon_id)
-    return cons
\ No newline at end of file
+    return cons
+
+
+# The binary graph format:
+# - the magic bytes `BINARY_GRAPH_MAGIC`, followed by the format version as unsigned short,
+# - the length of the JSON encoded header as unsigned long long, followed by the header,
+# - the data blocks listed in the header, i.e. the node IDs, the node indices of edge
+#   endpoints and one block per node or edge attribute, each optionally preceded by a mask
+#   marking the rows which have a value for the attribute.
+BINARY_GRAPH_MAGIC = b'CLICSGRAPH'
+BINARY_GRAPH_VERSION = 1
+_PREAMBLE = struct.Struct('<HQ')
+_INT64 = (-2 ** 63, 2 ** 63 - 1)
+_MISSING = object()
+
+
+def _column(values):
+    """
+    Determine the type of a column of attribute values and serialize it.
+    """
+    present = [v for v in values if v is not _MISSING]
+    if all(type(v) is int and _INT64[0] <= v <= _INT64[1] for v in present):
+        type_ = 'i'
+        data = _bytes(array('q', present))
+    elif all(type(v) is float for v in present):
+        type_ = 'f'
+        data = _bytes(array('d', present))
+    else:
+        if all(isinstance(v, str) for v in present):
+            type_ = 's'
+        else:
+            type_, present = 'j', [json.dumps(v) for v in present]
+        data = _bytes(array('q', [len(v) for v in present])) + ''.join(present).encode('utf8')
+    mask = b'' if len(present) == len(values) \
+        else bytes(bytearray(v is not _MISSING for v in values))
+    return type_, mask, data
+
+
+def _values(type_, data, n):
+    if type_ == 'i':
+        return _array('q', data)
+    if type_ == 'f':
+        return _array('d', data)
+    lengths = _array('q', data[:8 * n])
+    text, res, start = bytes(data[8 * n:]).decode('utf8'), [], 0
+    for length in lengths:
+        res.append(text[start:start + length])
+        start += length
+    return [json.loads(v) for v in res] if type_ == 'j' else res
+
+
+def _bytes(values):
+    # Data is stored in little-endian byte order:
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values.tobytes()
+
+
+def _array(typecode, data):
+    res = array(typecode)
+    res.frombytes(data)
+    if sys.byteorder != 'little':
+        res.byteswap()
+    return res
+
+
+def save_binary_graph(graph, fname):
+    """
+    Write a networkx graph to a file in the compact binary graph format.
+
+    :param graph: `networkx.Graph` or `networkx.DiGraph`.
+    :param fname: `pathlib.Path` of the file to write.
+    :return: `fname`
+    """
+    if graph.is_multigraph():
+        raise ValueError('multigraphs are not supported')
+    index = {node: i for i, node in enumerate(graph.nodes())}
+    header = OrderedDict([
+        ('directed', graph.is_directed()),
+        ('graph', graph.graph),
+        ('nodes', len(index)),
+        ('edges', graph.number_of_edges()),
+        ('blocks', [])])
+    blocks = []
+
+    def add_block(kind, name, values):
+        type_, mask, data = _column(values)
+        header['blocks'].append([kind, name, type_, len(mask), len(data)])
+        blocks.extend([mask, data])
+
+    add_block('id', None, list(index))
+    sources, targets, edges = array('q'), array('q'), []
+    for u, v, data in graph.edges(data=True):
+        sources.append(index[u])
+        targets.append(index[v])
+        edges.append(data)
+    for data in [sources, targets]:
+        header['blocks'].append(['endpoint', None, 'i', 0, len(data) * data.itemsize])
+        blocks.extend([b'', _bytes(data)])
+
+    for kind, records in [('node', [d for _, d in graph.nodes(data=True)]), ('edge', edges)]:
+        names = OrderedDict()
+        for data in records:
+            names.update((k, None) for k in data)
+        for name in names:
+            add_block(kind, name, [data.get(name, _MISSING) for data in records])
+
+    header = json.dumps(header).encode('utf8')
+    with fname.open('wb') as fp:
+        fp.write(BINARY_GRAPH_MAGIC)
+        fp.write(_PREAMBLE.pack(BINARY_GRAPH_VERSION, len(header)))
+        fp.write(header)
+        for block in blocks:
+            fp.write(block)
+    return fname
+
+
+def load_binary_graph(fname):
+    """
+    Read a networkx graph from a file in the compact binary graph format.
+
+    :param fname: `pathlib.Path` of the file to read.
+    :return: `networkx.Graph` or `networkx.DiGraph`.
+    """
+    import networkx as nx
+
+    with fname.open('rb') as fp:
+        data = memoryview(fp.read())
+    offset = len(BINARY_GRAPH_MAGIC)
+    if data[:offset] != BINARY_GRAPH_MAGIC:
+        raise ValueError('{0} is not a binary graph file'.format(fname))
+    version, size = _PREAMBLE.unpack_from(data, offset)
+    if version != BINARY_GRAPH_VERSION:
+        raise ValueError('{0}: unsupported binary graph format version {1}'.format(
+            fname, version))
+    offset += _PREAMBLE.size
+    header = json.loads(bytes(data[offset:offset + size]).decode('utf8'))
+    offset += size
+
+    ids, endpoints = None, []
+    attrs = {
+        'node': [{} for _ in range(header['nodes'])],
+        'edge': [{} for _ in range(header['edges'])]}
+    for kind, name, type_, masksize, datasize in header['blocks']:
+        mask = bytearray(data[offset:offset + masksize])
+        offset += masksize
+        if mask:
+            n = sum(mask)
+        else:
+            n = header['edges'] if kind in ['edge', 'endpoint'] else header['nodes']
+        values = _values(type_, data[offset:offset + datasize], n)
+        offset += datasize
+        if kind == 'id':
+            ids = list(values)
+        elif kind == 'endpoint':
+            endpoints.append(values)
+        else:
+            rows = attrs[kind]
+            if mask:
+                rows = [row for row, present in zip(rows, mask) if present]
+            for row, value in zip(rows, values):
+                row[name] = value
+
+    graph = nx.DiGraph() if header['directed'] else nx.Graph()
+    graph.graph.update(header['graph'])
+    graph.add_nodes_from(zip(ids, attrs['node']))
+    graph.add_edges_from(
+        (ids[u], ids[v], d) for u, v, d in zip(endpoints[0], endpoints[1], attrs['edge']))
+    return graph
@@ -19,11 +19,12 @@ def repos(tmpdir):
     return Path(str(tmpdir))
 
 
+class ClicsDataset(Dataset):
+    dir = str(Path(__file__).parent / 'dataset')
+
+
 @pytest.fixture(scope='session')
 def dataset():
-    class ClicsDataset(Dataset):
-        dir = str(Path(__file__).parent / 'dataset')
-
     return ClicsDataset()
 
 
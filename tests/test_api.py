@@ -21,3 +21,50 @@ def test_json_dump(api):
     api.json_dump({}, 'test.json')
     assert (api.repos / 'test.json').exists()
     assert api._log.info.called
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_json_export(api, workers):
+    api.existing_dir('test').joinpath('stale.json').write_text('{}')
+    written = api.json_export(
+        [('a.json', {'b': 1, 'a': 2}), ('b.json', []), ('a.json', {'a': 1})], 'test',
+        workers=workers)
+    assert len(written) == 2
+    assert sorted(p.name for p in api.path('test').iterdir()) == ['a.json', 'b.json']
+    assert api.path('test', 'a.json').read_text() == '{"a": 1}'
+
+    assert api.json_export([('a.json', {'a': 1}), ('b.json', [1])], 'test') == \
+        [api.path('test', 'b.json')]
+
+
+def test_evidence(api):
+    api.evidence_export([[[i]] for i in range(1500)], 'a')
+    assert api.evidence('a', 1234) == [[1234]]
+    assert len(list(api.path('app', 'source', 'evidence', 'a').iterdir())) == 2
+    # Exporting another aggregate leaves the evidence of existing networks intact:
+    api.evidence_export([[[-i]] for i in range(10)], 'b')
+    assert api.evidence('b', 5) == [[-5]]
+    assert api.evidence('a', 5) == [[5]]
+
+
+def test_save_graphs(api, mocker):
+    import networkx as nx
+
+    def graphs(n):
+        for threshold in range(1, n + 1):
+            graph = nx.Graph()
+            graph.add_edge('1', '2', weight=threshold)
+            yield threshold, 'families', graph
+
+    with api.stage('outer'):
+        # A single graph is written in-process:
+        pool = mocker.patch('pyclics.api.ProcessPoolExecutor')
+        assert len(api.save_graphs(graphs(1), 'g', workers=2)) == 2
+        assert not pool.called
+        mocker.stopall()
+        # The resource usage of writing graphs in worker processes is recorded, too:
+        assert len(api.save_graphs(graphs(3), 'g', workers=2)) == 6
+    writes = [s for s in api.instrumentation.stages if s.name.endswith(' write')]
+    assert [s.name for s in writes] == ['gml write', 'bin write'] * 4
+    assert all(s.level == 1 and s.wall_time is not None for s in writes)
+    assert len(list(api.path('graphs').glob('g-*-families.bin'))) == 3
@@ -1,10 +1,19 @@
 from __future__ import unicode_literals
+import asyncio
+import json
 import shutil
+import sqlite3
+import subprocess
+import sys
+from collections import Counter
+from itertools import combinations
 
 import pytest
 from clldutils.clilib import ParserError
 
 from pyclics.api import Clics
+from pyclics.models import Network
+from pyclics.server import AppServer
 from pyclics import commands
 from pyclics import __main__  # noqa
 
@@ -17,6 +26,19 @@ def api(repos, db):
     return Clics(str(repos))
 
 
+def test_import_time():
+    # Libraries which take long to import must only be imported by the commands using them, to
+    # keep the startup time of the `clics` command low:
+    heavy = [
+        'geojson', 'igraph', 'networkx', 'numpy', 'pycldf', 'pyconcepticon', 'pyglottolog',
+        'pylexibank', 'scipy', 'sqlalchemy', 'tabulate', 'tqdm']
+    loaded = subprocess.check_output([
+        sys.executable,
+        '-c',
+        'import sys, pyclics.__main__; print(" ".join(sorted(sys.modules)))'])
+    assert not set(loaded.decode('utf8').split()).intersection(heavy)
+
+
 def test_load(mocker, tmpdir, repos, dataset):
     with pytest.raises(ParserError):
         commands.load(mocker.Mock(args=[]))
@@ -26,9 +48,11 @@ def test_load(mocker, tmpdir, repos, dataset):
         commands.load(mocker.Mock(args=[str(repos.joinpath('abc')), str(repos)]))
     tmpdir.join('load').mkdir()
     api = Clics(str(tmpdir.join('load')))
-    mocker.patch('pyclics.commands.iter_datasets', lambda: [dataset])
-    commands.load(mocker.Mock(args=[str(repos), str(repos)], api=api))
-    commands.load(mocker.Mock(args=[str(repos), str(repos)], api=api, unloaded=True))
+    mocker.patch('pylexibank.dataset.iter_datasets', lambda: [dataset])
+    commands.load(mocker.Mock(args=[str(repos), str(repos)], api=api, workers=1))
+    commands.load(mocker.Mock(args=[str(repos), str(repos)], api=api, unloaded=True, workers=1))
+    commands.load(mocker.Mock(args=[str(repos), str(repos)], api=api, unloaded=False, workers=2))
+    assert api.db.datasets == [dataset.id]
 
 
 def test_list(api, mocker, capsys):
@@ -42,15 +66,73 @@ def test_list(api, mocker, capsys):
 
 def test_workflow(api, mocker, capsys):
     args = mocker.Mock(
-        api=api, graphname='g', threshold=1, edgefilter='families', weight='FamilyWeight')
+        api=api,
+        graphname='g',
+        threshold=1,
+        edgefilter='families',
+        weight='FamilyWeight',
+        workers=1,
+        sparse=False,
+        thresholds=None,
+        edgefilters=None)
     commands.colexification(args)
     out, err = capsys.readouterr()
     assert 'Concept B' in out
+    gml = api.path('graphs', 'g-1-families.gml').read_text(encoding='utf8')
+
+    # Colexifications are computed - and stored - by the worker processes, too:
+    with api.db.connection() as conn:
+        conn.execute('delete from clics_wordlist')
+        conn.commit()
+    args.workers = 2
+    commands.colexification(args)
+    assert api.path('graphs', 'g-1-families.gml').read_text(encoding='utf8') == gml
+    assert api.db.update_colexifications(api.db.varieties) == []
+    args.workers = 1
+
+    def weights(graph):
+        return {
+            frozenset([a, b]): (d['FamilyWeight'], d['LanguageWeight'], d['WordWeight'])
+            for a, b, d in graph.edges(data=True)}
+
+    graph = api.load_graph('g', 1, 'families', fmt='gml')
+    expected = weights(graph)
+    # The evidence is only referenced by the network and its edges:
+    a, b, data = next(iter(graph.edges(data=True)))
+    assert sorted(data) == ['FamilyWeight', 'LanguageWeight', 'WordWeight', 'evidence']
+    evidence = api.evidence(graph.graph['evidence'], data['evidence'])
+    assert len(evidence) >= data['WordWeight']
+    args.sparse = True
+    commands.colexification(args)
+    graph = api.load_graph('g', 1, 'families')
+    assert weights(graph) == expected
+    assert 'evidence' not in graph.graph
+    args.sparse = False
+    commands.colexification(args)
 
     commands.communities(args)
+    stages = {s.name: s for s in api.instrumentation.stages}
+    assert stages['infomap'].counts['communities'] > 1
+    assert stages['graph load'].counts['edges'] == stages['igraph conversion'].counts['edges']
     # test overwriting:
     commands.communities(args)
     commands.subgraph(args, neighbor_weight=1)
+    _check_server(api, mocker)
+
+    # Only save the graphs:
+    args.export = False
+    for name in ['infomap', 'subgraph']:
+        api.path('graphs', '{0}-1-families.bin'.format(name)).unlink()
+    infomap_names = api.path('app', 'source', 'infomap-names.js').read_text(encoding='utf8')
+    shutil.rmtree(str(api.path('app', 'cluster')))
+    commands.communities(args)
+    commands.subgraph(args, neighbor_weight=1)
+    for name in ['infomap', 'subgraph']:
+        assert api.path('graphs', '{0}-1-families.bin'.format(name)).exists()
+    assert not api.path('app', 'cluster').exists()
+    assert api.path('app', 'source', 'infomap-names.js').read_text(encoding='utf8') == \
+        infomap_names
+    args.export = True
     commands.articulationpoints(args)
     commands.graph_stats(args)
     out, _ = capsys.readouterr()
@@ -71,3 +153,145 @@ def test_workflow(api, mocker, capsys):
     commands.graph_stats(args)
     out, err = capsys.readouterr()
     assert 'edges         69' in out
+
+    args.graphname, args.thresholds, args.edgefilters, args.workers = \
+        'sweep', '3-5', 'languages,words', 2
+    commands.colexification(args)
+    out, _ = capsys.readouterr()
+    assert 'Threshold 4, edge filter words' in out
+    for name in ['3-languages', '5-words']:
+        assert api.path('graphs', 'sweep-{0}.gml'.format(name)).read_text(encoding='utf8') == \
+            api.path('graphs', 'g-{0}.gml'.format(name)).read_text(encoding='utf8')
+    assert len(list(api.path('graphs').glob('sweep-*.bin'))) == 6
+
+
+@pytest.mark.parametrize(
+    'thresholds,edgefilters,edgefilter',
+    [('1-x', None, 'families'), ('1,,3', None, 'families'), (None, 'families,concepts', None),
+     (None, None, 'concepts')])
+def test_colexification_variants(api, mocker, thresholds, edgefilters, edgefilter):
+    with pytest.raises(ParserError):
+        commands.colexification(mocker.Mock(
+            api=api, threshold=1, thresholds=thresholds, edgefilters=edgefilters,
+            edgefilter=edgefilter))
+
+
+def _check_server(api, mocker):
+    def normalized(content):
+        data = json.loads(content)
+        return (
+            sorted(json.dumps(n, sort_keys=True) for n in data['nodes']),
+            sorted(sorted(a['id'] for a in adj) for adj in data['adjacency']))
+
+    server = AppServer(api, 1, 'families', graphname='g', neighbor_weight=1)
+    for kind in ['cluster', 'subgraph']:
+        for p in list(api.path('app', kind).iterdir())[:5]:
+            status, headers, body = server.response('GET', '/{0}/{1}'.format(kind, p.name), {})
+            assert status == 200
+            assert normalized(body.decode('utf8')) == normalized(p.read_text(encoding='utf8'))
+            status, _, body = server.response(
+                'GET', '/{0}/{1}'.format(kind, p.name), {'if-none-match': headers['ETag']})
+            assert status == 304 and not body
+    assert server.response('GET', '/source/subgraph-names.js', {})[2].startswith(b'var SUBG')
+    assert server.response('GET', '/', {})[0] == 200
+    assert server.response('GET', '/source/d3.v3.js', {})[0] == 200
+    assert server.response('GET', '/../clics.sqlite', {})[0] == 404
+    # Exported files of unknown clusters or subgraphs are not served:
+    for kind in ['cluster', 'subgraph']:
+        api.path('app', kind, 'stale.json').write_text('{}', encoding='utf8')
+        assert server.response('GET', '/{0}/stale.json'.format(kind), {})[0] == 404
+        api.path('app', kind, 'stale.json').unlink()
+    assert server.response('POST', '/', {})[0] == 405
+
+    async def request():
+        srv = await server.start(port=0)
+        port = srv.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'HEAD /graph.html HTTP/1.1\r\nHost: localhost\r\n\r\n')
+        response = await reader.read()
+        writer.close()
+        srv.close()
+        await srv.wait_closed()
+        return response
+
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(request()).startswith(b'HTTP/1.1 200 OK')
+    finally:
+        loop.close()
+
+    # The server runs on its own event loop, which is closed when the server is interrupted.
+    # Since `run_until_complete` runs the loop, too, only the second run - i.e. the one serving
+    # requests - is interrupted:
+    run_forever, loops = asyncio.base_events.BaseEventLoop.run_forever, []
+
+    def interrupted(loop):
+        loops.append(loop)
+        if len(loops) == 2:
+            raise KeyboardInterrupt
+        return run_forever(loop)
+
+    mocker.patch.object(
+        asyncio.base_events.BaseEventLoop, 'run_forever', autospec=True, side_effect=interrupted)
+    server.serve_forever(port=0)
+    assert len(loops) == 3 and loops[0].is_closed()
+
+
+def test_require_sparse(api, mocker, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'scipy', None)
+    with pytest.raises(ParserError) as e:
+        commands.create_lang_graph(mocker.Mock(api=api, threshold=2, graphname='lg'))
+    assert 'pyclics[sparse]' in str(e.value)
+    with pytest.raises(ParserError):
+        commands.colexification(mocker.Mock(api=api, sparse=True, threshold=1))
+
+
+def test_create_lang_graph(api, mocker, repos, monkeypatch):
+    # A variety - sorted first - without forms mapped to Concepticon, thus without
+    # colexifications:
+    with api.db.connection() as conn:
+        conn.execute(
+            "insert into languagetable (dataset_id, id, name, glottocode, family) "
+            "select id, 'Aaa', 'Aaa', 'glot1234', 'family' from dataset")
+        conn.execute(
+            "insert into parametertable (dataset_id, id, name) "
+            "select id, 'unmapped', 'unmapped' from dataset")
+        conn.execute(
+            "insert into formtable (dataset_id, id, language_id, parameter_id, value, form) "
+            "select id, 'Aaa-1', 'Aaa', 'unmapped', 'xe', 'xe' from dataset")
+        conn.commit()
+
+    monkeypatch.chdir(str(repos))
+    commands.create_lang_graph(mocker.Mock(api=api, threshold=2, graphname='lg'))
+    graph = Network('lg', 2, 'colexifications', api.path('lang_graphs')).load()
+    assert graph.number_of_nodes() == 10
+    shared = Counter()
+    colexifications = json.loads(
+        api.path('lang_graphs', 'all_colexifications.json').read_text(encoding='utf8'))
+    for gids in colexifications.values():
+        shared.update(frozenset(pair) for pair in combinations(gids, 2))
+    assert graph.edges()
+    evidence = api.lang_graph_evidence('lg', 2)
+    for a, b, data in graph.edges(data=True):
+        assert data['weight'] >= 2
+        assert data['weight'] == shared[frozenset([a, b])]
+        colexified = evidence.shared(a, b)
+        assert data['weight'] == len(colexified) == len(evidence.shared(b, a))
+        assert evidence.edge(data['evidence'])[2] == colexified
+    with pytest.raises(KeyError):
+        evidence.edge(0)
+    with pytest.raises(sqlite3.OperationalError):
+        api.lang_graph_evidence('x', 2).shared(a, b)
+
+
+def test_reindex_forms(api, mocker):
+    args = mocker.Mock(api=api)
+    commands.reindex_forms(args)
+    assert args.log.info.called
+
+
+def test_optimize(api, mocker, capsys):
+    commands.optimize(mocker.Mock(api=api))
+    out, _ = capsys.readouterr()
+    assert 'wordlists' in out
+    assert not any('SCAN' in s and 'INDEX' not in s for s in api.db.query_plan('wordlists'))
@@ -1,6 +1,11 @@
+import pickle
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
 import pytest
 
-from pyclics.db import clics_form
+from pyclics.db import clics_form, clics_forms, Database
 
 
 @pytest.mark.parametrize(
@@ -16,6 +21,7 @@ from pyclics.db import clics_form
 )
 def test_clics_form(form, clics):
     assert clics == clics_form(form)
+    assert [clics, clics] == clics_forms([form, form])
 
 
 def test_db_queries(db):
@@ -30,3 +36,141 @@ def test_db_queries(db):
             break
     concepts = list(db.iter_concepts())
     assert len(concepts) == 499
+
+
+def test_iter_wordlists(db):
+    varieties = db.varieties
+    wordlists = list(db.iter_wordlists(varieties))
+    assert [v for v, _ in wordlists] == varieties
+    for v, forms in wordlists:
+        assert forms and all(f.source == v.source for f in forms)
+
+    # Only the selected varieties are returned:
+    assert [v for v, _ in db.iter_wordlists(varieties[1:2])] == varieties[1:2]
+
+
+def test_indexes(db):
+    db.update_schema()
+    indexes = [r[0] for r in db.fetchall("SELECT name FROM sqlite_master WHERE type='index'")]
+    assert all(name in indexes for name, _, _ in db.indexes)
+
+
+def test_iter_concepts(db):
+    concepts = list(db.iter_concepts())
+    assert sum(len(c.forms) for c in concepts) == db.fetchone(
+        "select count(*) from formtable as f, parametertable as p "
+        "where f.parameter_id = p.id and f.dataset_id = p.dataset_id")[0]
+    assert all(c.families == ['family'] for c in concepts)
+    assert all(c.varieties == sorted(set(c.varieties)) for c in concepts)
+
+
+def test_colexifications(db):
+    varieties = db.varieties
+    db.update_colexifications(varieties)
+    assert db.update_colexifications(varieties) == []
+    pairs = list(db.iter_colexifications(varieties))
+    assert all(a.concepticon_id != b.concepticon_id for _, v in pairs for a, b in v)
+
+    # Re-indexing forms invalidates the colexifications of their datasets:
+    with db.connection() as conn:
+        conn.execute("update formtable set clics_form = 'xxx' where rowid = 1")
+        conn.commit()
+    assert db.reindex_forms() == 1
+    assert db.update_colexifications(varieties) == varieties
+    assert list(db.iter_colexifications(varieties)) == pairs
+
+    # Adding (or removing) forms changes the fingerprint of a dataset:
+    v = varieties[0]
+    with db.connection() as conn:
+        conn.execute("""\
+insert into formtable (dataset_id, id, language_id, parameter_id, value, form, clics_form)
+select dataset_id, 'new', language_id, parameter_id, 'x', 'x', 'x'
+from formtable where dataset_id = ? and language_id = ? limit 1""", (v.source, v.id))
+        conn.commit()
+    try:
+        assert db.update_colexifications(varieties) == varieties
+        assert db.update_colexifications(varieties[:1]) == []
+    finally:
+        with db.connection() as conn:
+            conn.execute("delete from formtable where id = 'new'")
+            conn.commit()
+    assert db.update_colexifications(varieties) == varieties
+    assert list(db.iter_colexifications(varieties)) == pairs
+
+    # Colexifications are computed for datasets without version, too:
+    version = db.fetchall("select version from dataset")[0][0]
+    with db.connection() as conn:
+        conn.execute("update dataset set version = null")
+        conn.execute("delete from clics_wordlist")
+        conn.commit()
+    try:
+        assert db.update_colexifications(varieties) == varieties
+        assert db.update_colexifications(varieties) == []
+    finally:
+        with db.connection() as conn:
+            conn.execute("update dataset set version = ?", (version,))
+            conn.commit()
+    assert list(db.iter_colexifications(varieties)) == pairs
+
+
+def test_reindex_forms(db):
+    assert db.reindex_forms(chunksize=100) == 0
+    with db.connection() as conn:
+        conn.execute("update formtable set clics_form = null where rowid < 10")
+        conn.commit()
+    assert db.reindex_forms(chunksize=100) == 9
+
+
+def test_readonly(db):
+    rodb = Database(db.fname, readonly=True)
+    assert len(rodb.varieties) == 9
+    with rodb.connection() as conn:
+        assert conn is rodb._connection
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("delete from formtable")
+    assert pickle.loads(pickle.dumps(rodb))._connection is None
+    rodb.close()
+
+
+def test_load_datasets(tmpdir, dataset):
+    db = Database(str(tmpdir.join('serial.sqlite')))
+    assert list(db.load_datasets([dataset])) == [dataset.id]
+    parallel = Database(str(tmpdir.join('parallel.sqlite')))
+    assert list(parallel.load_datasets([dataset] * 5, workers=2)) == [dataset.id] * 5
+    assert tmpdir.listdir(lambda p: p.basename.startswith('clics-load-')) == []
+    for table in ['dataset', 'FormTable', 'LanguageTable', 'ParameterTable', 'SourceTable']:
+        sql = 'select * from {0} order by 1, 2'.format(table)
+        assert parallel.fetchall(sql) == db.fetchall(sql)
+    assert parallel.tables == db.tables
+
+
+def test_readonly_concurrent_write(db):
+    rodb = Database(db.fname, readonly=True)
+    rows = rodb._iter_rows('select id, clics_form from formtable order by rowid')
+    # The read transaction is open, while the row is written:
+    first = next(rows)
+    with db.connection() as conn:
+        conn.execute("update formtable set clics_form = 'xxx' where rowid = 1")
+        conn.commit()
+    try:
+        assert len(list(rows)) + 1 == len(db.fetchall('select id from formtable'))
+        assert rodb.fetchone('select clics_form from formtable where rowid = 1') == ('xxx',)
+    finally:
+        with db.connection() as conn:
+            conn.execute("update formtable set clics_form = ? where rowid = 1", (first[1],))
+            conn.commit()
+        rodb.close()
+    assert not Path(str(db.fname) + '-wal').exists()
+
+
+def test_journal_mode(tmpdir):
+    fname = Path(str(tmpdir.join('db.sqlite')))
+    with closing(sqlite3.connect(str(fname))) as conn:
+        conn.execute('create table t (a)')
+    db = Database(fname)
+    # Connections don't switch existing databases to WAL mode ...
+    assert db.fetchall('select * from t') == []
+    assert db.fetchone('pragma journal_mode') == ('delete',)
+    # ... but creating (or updating) the schema does:
+    db.create(force=True)
+    assert db.fetchone('pragma journal_mode') == ('wal',)
@@ -0,0 +1,47 @@
+# coding: utf8
+from __future__ import unicode_literals, print_function, division
+import json
+import pstats
+from pathlib import Path
+
+import pytest
+
+from pyclics.instrumentation import Instrumentation, peak_rss
+
+
+def test_Instrumentation(tmpdir):
+    instrumentation = Instrumentation(profile_dir=Path(str(tmpdir)))
+    with instrumentation.stage('outer', rows=5) as outer:
+        with instrumentation.stage('Inner stage') as inner:
+            data = list(range(100000))
+            inner.count(items=len(data))
+        outer.count(edges=3)
+
+    assert [s.name for s in instrumentation.stages] == ['outer', 'Inner stage']
+    assert [s.level for s in instrumentation.stages] == [0, 1]
+    assert outer.counts == {'edges': 3, 'rows': 5}
+    assert outer.wall_time >= inner.wall_time and outer.cpu_time >= 0
+    assert outer.peak_rss >= inner.peak_rss > 0
+    assert inner.profile == '02-inner-stage.prof'
+    assert pstats.Stats(str(tmpdir.join(inner.profile))).total_calls
+
+    with pytest.raises(ValueError):
+        with instrumentation.stage('failing'):
+            raise ValueError()
+    assert instrumentation.stages[-1].wall_time is not None
+
+    fname = instrumentation.write(Path(str(tmpdir)) / 'stages.json')
+    res = json.loads(fname.read_text(encoding='utf8'))
+    assert res['stages'][0]['profile'] == '01-outer.prof'
+    assert res['stages'][1]['counts'] == {'items': 100000}
+
+
+def test_Instrumentation_peak_rss():
+    peak = peak_rss()
+    instrumentation = Instrumentation()
+    with instrumentation.stage('stage') as stage:
+        bytearray(10 * 1024 ** 2)
+    # Without profiling, the peak of the process is not reset:
+    assert stage.peak_rss >= stage.peak_rss_start >= peak
+    assert peak_rss() >= stage.peak_rss
+    assert stage.profile is None
@@ -1,4 +1,7 @@
+import html
+
 import networkx
+import pytest
 
 from pyclics.models import *
 
@@ -33,3 +36,36 @@ def test_Network(tmpdir):
     assert p.exists()
     assert n.components() == [{'n1', 'n2'}]
     assert n.communities()['x'] == ['n1']
+
+    g = _make_graph()
+    g.graph['name'] = 'g'
+    g.nodes['n2'].update(weight=1.5, flag=True, big=2 ** 70, label='\u00e4&amp;')
+    g.add_edge('n2', 'n3', weight=3)
+    p = n.save(g, fmt='bin')
+    assert p.name == 'g-t-e.bin'
+    assert n.load() is not None
+    g2 = n.load('bin')
+    assert list(g2.nodes(data=True)) == list(g.nodes(data=True))
+    assert list(g2.edges(data=True)) == list(g.edges(data=True))
+    assert g2.graph == g.graph
+    assert len(n.load('gml')) == 2
+
+    n.save(g)
+    assert n.fname.read_text() == '\n'.join(
+        html.unescape(line) for line in networkx.generate_gml(g))
+    assert n.load('gml').nodes['n2']['weight'] == 1.5
+
+    p.write_bytes(b'abc')
+    with pytest.raises(ValueError):
+        n.load('bin')
+    with pytest.raises(ValueError):
+        n.save(g, fmt='xyz')
+
+
+def test_slots():
+    v = Variety('id', 'source', 'name', 'gc', 'f', 'ma', None, 2.3)
+    assert not hasattr(v, '__dict__')
+    assert v.as_node_attrs() == {
+        'id': 'id', 'source': 'source', 'name': 'name', 'glottocode': 'gc', 'family': 'f',
+        'macroarea': 'ma', 'latitude': 2.3}
+    assert not hasattr(Form('', '', '', '', '', '', '', '', ''), '__dict__')
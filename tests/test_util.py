@@ -1,8 +1,9 @@
 # coding: utf8
 from __future__ import unicode_literals, print_function, division
+import pickle
 
 from pyclics.util import *
-from pyclics.models import Form
+from pyclics.models import Form, Variety
 
 
 def test_colexification():
@@ -10,3 +11,151 @@ def test_colexification():
     formB = Form('', '', 'yz', 'abcd', '', '2', '', '', '')
     res = full_colexification([formA, formB])
     assert len(res['abcd']) == 2
+
+
+def test_colexified_pairs():
+    formA = Form('', '', 'xy', 'abcd', '', '1', '', '', '')
+    formB = Form('', '', 'yz', 'abcd', '', '2', '', '', '')
+    formC = Form('', '', 'yz', 'abcd', '', '2', '', '', '')
+    assert len(list(colexified_pairs([formA, formB, formC]))) == 2
+
+
+def test_chunked():
+    assert chunked(list(range(5)), 2) == [[0, 1, 2], [3, 4]]
+    assert chunked([1], 3) == [[1]]
+
+
+def test_Colexifications():
+    v1 = Variety('l1', 'ds', 'name', 'gc', 'f1', 'ma', None, None)
+    v2 = Variety('l2', 'ds', 'name', 'gc', 'f2', 'ma', None, None)
+    formA = Form('a', 'ds', 'xy', 'abcd', '', '1', '', '', '')
+    formB = Form('b', 'ds', 'yz', 'abcd', '', '2', '', '', '')
+
+    serial = Colexifications()
+    serial.add(v1, [(formA, formB)])
+    serial.add(v2, [(formB, formA)])
+    assert len(serial) == 1
+
+    c1, c2 = Colexifications(), Colexifications()
+    c1.add(v1, [(formA, formB)])
+    c2.add(v2, [(formB, formA)])
+    c1.update(c2)
+    assert c1.weights() == serial.weights() == {('1', '2'): (2, 2, 2)}
+    assert c1.digest() == serial.digest() != Colexifications().digest()
+    attrs = c1.edge_attrs('2', '1')
+    assert attrs == serial.edge_attrs('1', '2')
+    assert list(attrs.items()) == [
+        ('evidence', 0), ('WordWeight', 2), ('FamilyWeight', 2), ('LanguageWeight', 2)]
+    assert list(c1.evidence()) == list(serial.evidence()) == [[
+        ['ds-a', 'ds-b', 'abcd', 'ds-l1', 'f1', 'xy', 'yz'],
+        ['ds-b', 'ds-a', 'abcd', 'ds-l2', 'f2', 'yz', 'xy']]]
+
+    # Aggregates of varieties with distinct forms - in multiple families - are merged by
+    # translating form IDs with an offset:
+    varieties = [
+        Variety('l{0}'.format(i), 'ds', 'name', 'gc', 'f{0}'.format(i % 3), 'ma', None, None)
+        for i in range(6)]
+
+    def pairs(i):
+        forms = [
+            Form('{0}-{1}'.format(i, c), 'ds', c, 'x', '', c, '', '', '') for c in '1234'[i % 3:]]
+        return list(zip(forms, forms[1:]))
+
+    serial, chunks = Colexifications(), [Colexifications(), Colexifications()]
+    for i, variety in enumerate(varieties):
+        serial.add(variety, pairs(i))
+        chunks[i // 4].add(variety, pairs(i))
+    # Aggregates can be sent from worker processes in a compact representation:
+    copies = [Colexifications() for _ in chunks]
+    for copy, c in zip(copies, chunks):
+        copy.update(pickle.loads(pickle.dumps(c.compact())))
+    assert [c.weights() for c in copies] == [c.weights() for c in chunks]
+    assert [list(c.evidence()) for c in copies] == [list(c.evidence()) for c in chunks]
+    chunks[0].update(copies[1].compact())
+    assert chunks[0].weights() == serial.weights()
+    assert list(chunks[0].evidence()) == list(serial.evidence())
+    assert chunks[0].weights()['3', '4'] == (3, 6, 6)
+
+
+def test_colexification_weights():
+    v1 = Variety('l1', 'ds', 'name', 'gc', 'f1', 'ma', None, None)
+    v2 = Variety('l2', 'ds', 'name', 'gc', 'f1', 'ma', None, None)
+    res = colexification_weights([
+        (v1, [('abcd', '1'), ('abcd', '2'), ('abcd', '2'), ('x', '3')]),
+        (v2, [('abcd', '2'), ('abcd', '1'), ('', '3'), ('abcd', None)]),
+    ])
+    assert res == {('1', '2'): (1, 2, 3)}
+
+
+def test_LanguageColexifications():
+    v1 = Variety('l1', 'ds', 'name', 'gc', 'f1', 'ma', None, None)
+    v2 = Variety('l2', 'ds', 'name', 'gc', 'f1', 'ma', None, None)
+    v3 = Variety('l3', 'ds', 'name', 'gc', 'f1', 'ma', None, None)
+    colexs = LanguageColexifications([
+        (v1, [('a', '1'), ('a', '2'), ('a', '3'), ('b', '4')]),
+        (v2, [('x', '2'), ('x', '1'), ('y', '3'), ('y', '4')]),
+        (v3, [('a', '3'), ('a', '1')]),
+    ])
+    assert colexs.weights() == [(0, 1, 1), (0, 2, 1)]
+    assert colexs.weights(threshold=2) == []
+    assert colexs.shared(0, 2) == [('1', '3')]
+    assert colexs.languages()[('1', '2')] == [v1, v2]
+
+
+def test_networkx2igraph():
+    import networkx
+
+    g = networkx.Graph()
+    g.add_node('a', Gloss='x', name='n')
+    g.add_node('b')
+    g.add_edge('a', 'b', weight=2)
+    ig = networkx2igraph(g)
+    assert ig.vs['name'] == [0, 1]
+    assert ig.vs['Name'] == ['a', 'b']
+    assert ig.vs['Gloss'] == ['x', None]
+    assert ig.es['weight'] == [2]
+
+
+def test_OutEdges():
+    import networkx
+
+    g = networkx.Graph()
+    g.add_nodes_from(['d', 'c', 'b', 'a'])
+    g.add_edge('a', 'b', FamilyWeight=5)
+    g.add_edge('a', 'd', FamilyWeight=5)
+    g.add_edge('a', 'c', FamilyWeight=1)
+    out_edges = OutEdges(g, 5)
+    assert out_edges.neighbors('a', {'a'}) == ['d', 'b']
+    assert out_edges.neighbors('a', {'a', 'd'}) == ['b']
+    assert OutEdges(g, 1).neighbors('a', {'a'}) == ['d', 'c', 'b']
+
+
+def test_Adjacency():
+    import networkx
+
+    g = networkx.star_graph(60)
+    g.add_edge(100, 101)
+    adj = Adjacency(g)
+    assert list(adj.neighbors(adj.nodes.index(100))) == [adj.nodes.index(101)]
+    res = adj.neighbourhoods(max_size=30, max_generation=50, generations=3)
+    assert res[0] == (0,)
+    assert res[1] == (0, 1)
+    assert res[-1] == (100, 101) and res[-1] is res[-2]
+
+    g = networkx.path_graph(5)
+    assert Adjacency(g).neighbourhoods()[0] == (0, 1, 2)
+    assert Adjacency(g).neighbourhoods(max_size=2)[0] == (0, 1)
+
+
+def test_subgraph_payload():
+    import networkx
+
+    g = networkx.Graph()
+    g.add_nodes_from((n, dict(Gloss=n.upper())) for n in 'abc')
+    g.add_edge('a', 'b', FamilyWeight=5, WordWeight=5)
+    g.add_edge('b', 'c', FamilyWeight=5, WordWeight=5)
+    # Only the node itself links to strongly connected nodes outside of the subgraph:
+    payload = subgraph_payload(g, 'b', ('a', 'b'), OutEdges(g, 5))
+    assert payload['nodes'][1]['id'] == 'b'
+    assert [e[4] for e in payload['nodes'][1]['OutEdge']] == ['c']
+    assert payload['nodes'][0]['OutEdge'] == []